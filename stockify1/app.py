@@ -1,23 +1,44 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-import json
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from flask_compress import Compress
 import os
+import orjson
+import hashlib
+import hmac
+import bcrypt
 from datetime import datetime, timedelta
-import yfinance as yf
-from functools import wraps
+from functools import wraps, lru_cache
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import mean_absolute_error
 import pandas as pd
-from models.historical_predictor import HistoricalPredictor
-from models.sentiment_analyzer import SentimentAnalyzer
-from models.hybrid_predictor import HybridPredictor
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from models.cache_utils import get_history_cached, get_info_cached, download_cached, closes_from_download, get_last_prices
+from models import currency_utils
+from models.currency_utils import get_usd_to_inr_rate
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import time
-import requests
+import threading
+import queue
+import atexit
+import logging
+import logging.handlers
+import sqlite3
 
 app = Flask(__name__)
 app.secret_key = 'stockify_secret_key_2024'  # Change this in production
 
+# Compress JSON/HTML responses (brotli or gzip, whichever the client accepts)
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
+# Model modules log through a queue so request threads never block writing to stderr
+_log_queue = queue.SimpleQueue()
+_models_logger = logging.getLogger('models')
+_models_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_models_logger.propagate = False
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # File to store user credentials
 USERS_FILE = 'users.json'
 
@@ -30,179 +51,15 @@ def format_dividend_yield(dividend_yield):
     else:
         return str(dividend_yield)
 
-# Currency conversion cache
-USD_TO_INR_RATE = None  # Will be fetched from live sources
-LAST_RATE_UPDATE = None
+# The USD to INR rate comes from models.currency_utils, so pages and models share one
+# cache, one set of providers and one on-disk rate file
 
-def fetch_live_exchange_rate():
-    """Fetch live USD to INR exchange rate from multiple sources - PRIORITIZING ACCURACY"""
-    
-    # Method 1: Try Google Finance (most accurate and up-to-date)
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get("https://www.google.com/finance/quote/USD-INR", headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            # Look for the exchange rate in various possible selectors
-            rate_element = soup.find('div', {'data-last-price': True}) or \
-                          soup.find('div', class_='YMlKec fxKbKc') or \
-                          soup.find('span', class_='YMlKec fxKbKc')
-            if rate_element:
-                rate_text = rate_element.get('data-last-price') or rate_element.get_text()
-                rate = float(rate_text.replace(',', ''))
-                if rate > 70 and rate < 100:
-                    print(f"Exchange rate from Google Finance: Rs {rate:.2f}/USD")
-                    return rate
-    except Exception as e:
-        print(f"Google Finance fetch failed: {str(e)}")
-    
-    # Method 2: Try Yahoo Finance (backup)
-    try:
-        usd_inr = yf.Ticker("USDINR=X")
-        hist = usd_inr.history(period="1d")
-        if not hist.empty:
-            rate = hist['Close'].iloc[-1]
-            if rate > 70 and rate < 100:  # Sanity check
-                print(f"Exchange rate from Yahoo Finance: Rs {rate:.2f}/USD")
-                return rate
-    except Exception as e:
-        print(f"Yahoo Finance fetch failed: {str(e)}")
-    
-    # Method 3: Try XE.com API (very accurate)
-    try:
-        response = requests.get("https://api.xe.com/v1/convert_from.json/?from=USD&to=INR&amount=1", timeout=8)
-        if response.status_code == 200:
-            data = response.json()
-            rate = float(data['rates']['INR'])
-            if rate > 70 and rate < 100:
-                print(f"Exchange rate from XE.com: Rs {rate:.2f}/USD")
-                return rate
-    except Exception as e:
-        print(f"XE.com fetch failed: {str(e)}")
-    
-    # Method 4: Try using INR=X alternative ticker
-    try:
-        inr = yf.Ticker("INR=X")
-        hist = inr.history(period="1d")
-        if not hist.empty:
-            rate = 1 / hist['Close'].iloc[-1]  # Inverse if needed
-            if rate > 70 and rate < 100:
-                print(f"Exchange rate from INR=X: Rs {rate:.2f}/USD")
-                return rate
-    except Exception as e:
-        print(f"INR=X fetch failed: {str(e)}")
-    
-    # Method 5: Try exchangerate-api.com (free tier)
-    try:
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get('INR')
-            if rate and rate > 70 and rate < 100:
-                print(f"Exchange rate from ExchangeRate-API: Rs {rate:.2f}/USD")
-                return rate
-    except Exception as e:
-        print(f"ExchangeRate-API fetch failed: {str(e)}")
-    
-    # Method 6: Try frankfurter.app (European Central Bank data)
-    try:
-        response = requests.get("https://api.frankfurter.app/latest?from=USD&to=INR", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get('INR')
-            if rate and rate > 70 and rate < 100:
-                print(f"Exchange rate from Frankfurter API: Rs {rate:.2f}/USD")
-                return rate
-    except Exception as e:
-        print(f"Frankfurter API fetch failed: {str(e)}")
-    
-    # If all methods fail, raise an error
-    print("ERROR: Could not fetch exchange rate from any source!")
-    print("Using emergency fallback rate of Rs 83.00")
-    return 83.0  # Emergency fallback only
-
-def get_most_accurate_exchange_rate():
-    """Get the most accurate exchange rate by trying multiple sources and averaging"""
-    rates = []
-    
-    # Try Google Finance first (most accurate)
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get("https://www.google.com/finance/quote/USD-INR", headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            rate_element = soup.find('div', {'data-last-price': True}) or \
-                          soup.find('div', class_='YMlKec fxKbKc') or \
-                          soup.find('span', class_='YMlKec fxKbKc')
-            if rate_element:
-                rate_text = rate_element.get('data-last-price') or rate_element.get_text()
-                rate = float(rate_text.replace(',', ''))
-                if 70 < rate < 100:
-                    rates.append(rate)
-                    print(f"Google Finance rate: Rs {rate:.2f}/USD")
-    except Exception as e:
-        print(f"Google Finance error: {str(e)}")
-    
-    # Try Yahoo Finance
-    try:
-        usd_inr = yf.Ticker("USDINR=X")
-        hist = usd_inr.history(period="1d")
-        if not hist.empty:
-            rate = hist['Close'].iloc[-1]
-            if 70 < rate < 100:
-                rates.append(rate)
-                print(f"Yahoo Finance rate: Rs {rate:.2f}/USD")
-    except Exception as e:
-        print(f"Yahoo Finance error: {str(e)}")
-    
-    # If we have multiple rates, return the average for highest accuracy
-    if len(rates) >= 2:
-        avg_rate = sum(rates) / len(rates)
-        print(f"Average rate from {len(rates)} sources: Rs {avg_rate:.2f}/USD")
-        return avg_rate
-    elif len(rates) == 1:
-        print(f"Single source rate: Rs {rates[0]:.2f}/USD")
-        return rates[0]
-    else:
-        # Fallback to the original method
-        return fetch_live_exchange_rate()
-
-def get_usd_to_inr_rate():
-    """Get current USD to INR exchange rate with caching"""
-    global USD_TO_INR_RATE, LAST_RATE_UPDATE
-    
-    # Update rate every 2 hours (7200 seconds) - OPTIMIZED for speed
-    current_time = datetime.now()
-    should_update = (
-        USD_TO_INR_RATE is None or 
-        LAST_RATE_UPDATE is None or 
-        (current_time - LAST_RATE_UPDATE).total_seconds() > 7200  # 2 hours instead of 1 hour
-    )
-    
-    if should_update:
-        try:
-            USD_TO_INR_RATE = get_most_accurate_exchange_rate()  # Use the more accurate method
-            LAST_RATE_UPDATE = current_time
-            print(f"Current Exchange Rate: Rs {USD_TO_INR_RATE:.2f}/USD (Updated at {current_time.strftime('%I:%M %p')})")
-        except Exception as e:
-            print(f"Error updating exchange rate: {str(e)}")
-            if USD_TO_INR_RATE is None:
-                USD_TO_INR_RATE = 83.0  # Only use fallback if never fetched
-    
-    return USD_TO_INR_RATE
+_INDIAN_SUFFIXES = ('.NS', '.BO', '.BSE', '.NSE')
 
+@lru_cache(maxsize=4096)
 def is_indian_stock(symbol):
     """Check if stock is Indian (NSE/BSE) or foreign (mainly US)"""
-    indian_suffixes = ['.NS', '.BO', '.BSE', '.NSE']
-    return any(symbol.upper().endswith(suffix) for suffix in indian_suffixes)
+    return symbol.upper().endswith(_INDIAN_SUFFIXES)
 
 def convert_price_to_inr(price, symbol):
     """Convert price to INR if it's a foreign stock"""
@@ -216,8 +73,8 @@ def convert_price_to_inr(price, symbol):
 
 # Initialize users file if it doesn't exist
 if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, 'w') as f:
-        json.dump([], f)
+    with open(USERS_FILE, 'wb') as f:
+        f.write(orjson.dumps([]))
 
 # Fetch exchange rate on startup
 print("\n" + "="*60)
@@ -232,15 +89,175 @@ except Exception as e:
     print(f"Warning: Could not fetch exchange rate: {str(e)}")
     print("="*60 + "\n")
 
+# In-memory user store - the JSON file is read once and written behind
+_USERS = None
+_USERS_BY_EMAIL = {}
+_USERS_DIRTY = False
+_USERS_LOCK = threading.RLock()
+# Serializes snapshot + write + replace so the writer thread and the exit flush never share a half-written file
+_USERS_WRITE_LOCK = threading.Lock()
+_WRITE_Q = queue.Queue()
+
 def load_users():
-    """Load users from JSON file"""
-    with open(USERS_FILE, 'r') as f:
-        return json.load(f)
+    """Load users, reading the JSON file only on first access"""
+    global _USERS, _USERS_BY_EMAIL
+    with _USERS_LOCK:
+        if _USERS is None:
+            with open(USERS_FILE, 'rb') as f:
+                _USERS = orjson.loads(f.read())
+            _USERS_BY_EMAIL = {u['email']: u for u in _USERS}
+        return _USERS
+
+def get_user(email):
+    """Look up a user by email"""
+    with _USERS_LOCK:
+        load_users()
+        return _USERS_BY_EMAIL.get(email)
 
 def save_users(users):
-    """Save users to JSON file"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    """Update the in-memory store and schedule a background write to disk"""
+    global _USERS, _USERS_BY_EMAIL, _USERS_DIRTY
+    with _USERS_LOCK:
+        _USERS = users
+        _USERS_BY_EMAIL = {u['email']: u for u in users}
+        _USERS_DIRTY = True
+    _WRITE_Q.put(1)
+
+def _write_users_file():
+    """Atomically write the in-memory users to the JSON file"""
+    global _USERS_DIRTY
+    with _USERS_WRITE_LOCK:
+        with _USERS_LOCK:
+            data = orjson.dumps(_USERS, option=orjson.OPT_INDENT_2)
+            _USERS_DIRTY = False
+        tmp = f"{USERS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, USERS_FILE)
+
+def _users_writer():
+    """Background thread that persists users, coalescing bursts of saves into one write"""
+    while True:
+        _WRITE_Q.get()
+        time.sleep(0.25)
+        while not _WRITE_Q.empty():
+            _WRITE_Q.get_nowait()
+        try:
+            _write_users_file()
+        except Exception as e:
+            print(f"Error saving users: {str(e)}")
+            _WRITE_Q.put(1)  # Retry on the next pass
+
+def _flush_users():
+    """Write any pending changes before the process exits"""
+    if _USERS_DIRTY:
+        _write_users_file()
+
+threading.Thread(target=_users_writer, daemon=True).start()
+atexit.register(_flush_users)
+
+# Portfolios live in SQLite - one indexed row per holding instead of rewriting users.json
+PORTFOLIO_DB = 'stockify.db'
+_db_local = threading.local()
+
+def get_db():
+    """Per-thread SQLite connection in autocommit + WAL mode"""
+    con = getattr(_db_local, 'con', None)
+    if con is None:
+        con = sqlite3.connect(PORTFOLIO_DB, isolation_level=None)
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('PRAGMA synchronous=NORMAL')
+        _db_local.con = con
+    return con
+
+def add_holding(user_id, symbol, name, quantity, buy_price, date):
+    """Insert a holding, merging repeat buys of a symbol into one position at the average buy price"""
+    get_db().execute(
+        """INSERT INTO portfolio (user_id, symbol, name, quantity, buy_price, date)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(user_id, symbol) DO UPDATE SET
+               buy_price = (buy_price * quantity + excluded.buy_price * excluded.quantity)
+                           / (quantity + excluded.quantity),
+               quantity = quantity + excluded.quantity,
+               name = COALESCE(name, excluded.name)""",
+        (user_id, symbol, name, quantity, buy_price, date)
+    )
+
+def init_portfolio_db():
+    """Create the portfolio table and move any holdings still stored in users.json into it"""
+    con = get_db()
+    con.execute("""CREATE TABLE IF NOT EXISTS portfolio (
+        user_id TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        name TEXT,
+        quantity REAL NOT NULL,
+        buy_price REAL NOT NULL,
+        date TEXT,
+        PRIMARY KEY (user_id, symbol)
+    )""")
+    
+    con.execute("CREATE TABLE IF NOT EXISTS portfolio_migrated (user_id TEXT PRIMARY KEY)")
+    
+    users = load_users()
+    pending = [user for user in users if 'portfolio' in user]
+    if not pending:
+        return
+    
+    # One transaction with a marker row per user, so a crash before users.json is
+    # rewritten (or a second process such as the debug reloader) never adds the
+    # same holdings twice
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        for user in pending:
+            if con.execute('SELECT 1 FROM portfolio_migrated WHERE user_id = ?', (user['email'],)).fetchone():
+                continue
+            for holding in user['portfolio']:
+                add_holding(user['email'], holding['symbol'], holding.get('name'),
+                            holding['quantity'], holding['buy_price'], holding.get('date'))
+            con.execute('INSERT INTO portfolio_migrated (user_id) VALUES (?)', (user['email'],))
+        con.execute('COMMIT')
+    except Exception:
+        con.execute('ROLLBACK')
+        raise
+    
+    with _USERS_LOCK:
+        for user in pending:
+            user.pop('portfolio', None)
+    save_users(users)
+    _write_users_file()  # Don't leave the migrated holdings to the write-behind thread
+
+init_portfolio_db()
+
+def resolve_company_name(symbol):
+    """Look up a company's long name - only called when a symbol is first stored"""
+    try:
+        return get_info_cached(symbol).get('longName', symbol)
+    except:
+        return symbol
+
+def hash_password(password):
+    """Hash a password with bcrypt, stored as hex in the users file"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(12)).hex()
+
+def check_password(user, password):
+    """Check a login password, upgrading legacy plaintext passwords to bcrypt on success"""
+    if 'password_hash' in user:
+        return bcrypt.checkpw(password.encode(), bytes.fromhex(user['password_hash']))
+    
+    if not hmac.compare_digest(user.get('password', '').encode(), password.encode()):
+        return False
+    password_hash = hash_password(password)
+    with _USERS_LOCK:
+        user['password_hash'] = password_hash
+        user.pop('password', None)
+        save_users(load_users())
+    return True
+
+def watchlist_entry(item):
+    """Normalize a watchlist entry - legacy entries are bare symbol strings"""
+    if isinstance(item, str):
+        return {'symbol': item, 'name': item}
+    return item
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -251,6 +268,34 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def jsonify_fast(obj):
+    """jsonify replacement using orjson - much faster for long numeric lists and NumPy arrays"""
+    response = app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        mimetype='application/json'
+    )
+    # Lets cache_json tell success from failure without decoding the body again
+    response.json_success = isinstance(obj, dict) and bool(obj.get('success'))
+    return response
+
+def cache_json(max_age, public=True):
+    """Decorator to add Cache-Control and a weak ETag to successful JSON responses"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = f(*args, **kwargs)
+            # Never let browsers hold on to a failed lookup; only responses built by
+            # jsonify_fast (or marked by hand) carry the success flag
+            if not getattr(response, 'json_success', False):
+                return response
+            response.set_etag(hashlib.md5(response.get_data()).hexdigest(), weak=True)
+            scope = 'public' if public else 'private'
+            response.headers['Cache-Control'] = f'{scope}, max-age={max_age}'
+            # Answers 304 Not Modified when If-None-Match matches
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
+
 @app.route('/')
 def index():
     """Landing page - redirects to login or home"""
@@ -259,19 +304,20 @@ def index():
     return redirect(url_for('login'))
 
 @app.route('/api/exchange-rate')
+@cache_json(3600)
 def get_exchange_rate():
     """Get current USD to INR exchange rate"""
     try:
         rate = get_usd_to_inr_rate()
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'rate': round(rate, 2),
             'currency_pair': 'USD/INR',
-            'last_updated': LAST_RATE_UPDATE.strftime('%Y-%m-%d %I:%M %p') if LAST_RATE_UPDATE else 'Just now',
+            'last_updated': currency_utils.LAST_RATE_UPDATE.strftime('%Y-%m-%d %I:%M %p') if currency_utils.LAST_RATE_UPDATE else 'Just now',
             'message': f'₹{rate:.2f} per USD'
         })
     except Exception as e:
-        return jsonify({
+        return jsonify_fast({
             'success': False,
             'message': str(e)
         })
@@ -288,23 +334,25 @@ def signup():
         if not email or not password or not name:
             return jsonify({'success': False, 'message': 'All fields are required'})
         
-        users = load_users()
-        
         # Check if user already exists
-        if any(user['email'] == email for user in users):
+        if get_user(email):
             return jsonify({'success': False, 'message': 'User already exists. Please login.'})
         
-        # Add new user
-        users.append({
-            'email': email,
-            'password': password,  # In production, hash this!
-            'name': name,
-            'created_at': datetime.now().isoformat(),
-            'watchlist': [],
-            'portfolio': []
-        })
-        
-        save_users(users)
+        # Hash outside the lock (bcrypt is slow), then re-check and add in one step
+        # so two concurrent signups for the same email can't both be stored
+        password_hash = hash_password(password)
+        with _USERS_LOCK:
+            if get_user(email):
+                return jsonify({'success': False, 'message': 'User already exists. Please login.'})
+            users = load_users()
+            users.append({
+                'email': email,
+                'password_hash': password_hash,
+                'name': name,
+                'created_at': datetime.now().isoformat(),
+                'watchlist': []
+            })
+            save_users(users)
         
         # Auto login after signup
         session['user_email'] = email
@@ -325,15 +373,13 @@ def login():
         if not email or not password:
             return jsonify({'success': False, 'message': 'Email and password are required'})
         
-        users = load_users()
-        
         # Find user
-        user = next((u for u in users if u['email'] == email), None)
+        user = get_user(email)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found. Please signup first.'})
         
-        if user['password'] != password:
+        if not check_password(user, password):
             return jsonify({'success': False, 'message': 'Invalid password'})
         
         # Set session
@@ -374,91 +420,111 @@ def stock_details(symbol):
     """Stock details page"""
     return render_template('stock.html', symbol=symbol, user_name=session.get('user_name'))
 
+def compute_market_status():
+    """Fetch Indian and International index quotes with one batched download"""
+    indices = {
+        'nifty': '^NSEI',
+        'sensex': '^BSESN',
+        'sp500': '^GSPC',
+        'nasdaq': '^IXIC',
+        'dow': '^DJI'
+    }
+    
+    # Single batched request for all indices instead of one request per index
+    df = download_cached(list(indices.values()), period="2d")
+    
+    results = {}
+    for name, symbol in indices.items():
+        try:
+            closes = closes_from_download(df, symbol)
+            if len(closes) >= 2:
+                current = closes.iloc[-1]
+                previous = closes.iloc[-2]
+                change = current - previous
+                change_percent = (change / previous) * 100
+                results[name] = {
+                    'price': round(current, 2),
+                    'change': round(change, 2),
+                    'change_percent': round(change_percent, 2)
+                }
+            elif len(closes) == 1:
+                results[name] = {
+                    'price': round(closes.iloc[-1], 2),
+                    'change': 0,
+                    'change_percent': 0
+                }
+        except:
+            pass
+    
+    return {
+        'success': True,
+        'indian_market': {
+            'nifty': results.get('nifty', {'price': 0, 'change': 0, 'change_percent': 0}),
+            'sensex': results.get('sensex', {'price': 0, 'change': 0, 'change_percent': 0})
+        },
+        'international_market': {
+            'sp500': results.get('sp500', {'price': 0, 'change': 0, 'change_percent': 0}),
+            'nasdaq': results.get('nasdaq', {'price': 0, 'change': 0, 'change_percent': 0}),
+            'dow': results.get('dow', {'price': 0, 'change': 0, 'change_percent': 0})
+        }
+    }
+
+# Latest market status, pre-serialized and shared by every client
+_market_cache = {'body': None, 'ts': 0}
+_market_lock = threading.Lock()
+
+def refresh_market_status():
+    """Recompute the market status and store the serialized response"""
+    body = orjson.dumps(compute_market_status(), option=orjson.OPT_SERIALIZE_NUMPY)
+    with _market_lock:
+        _market_cache['body'] = body
+        _market_cache['ts'] = time.time()
+    return body
+
+def _market_status_refresher():
+    """Background thread that refreshes the market status every 30 seconds"""
+    while True:
+        try:
+            refresh_market_status()
+        except Exception as e:
+            print(f"Error refreshing market status: {str(e)}")
+        time.sleep(30)
+
+threading.Thread(target=_market_status_refresher, daemon=True).start()
+
 @app.route('/api/market-status')
 @login_required
+@cache_json(30, public=False)
 def market_status():
-    """Get Indian and International market status - OPTIMIZED"""
+    """Get Indian and International market status from the background-refreshed cache"""
     try:
-        def get_index_data(symbol):
-            """Fetch index data with timeout and optimization"""
-            try:
-                ticker = yf.Ticker(symbol)
-                # Only fetch 2 days of history, much faster than .info
-                hist = ticker.history(period="2d")
-                if len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = current - previous
-                    change_percent = (change / previous) * 100
-                    return {
-                        'price': round(current, 2),
-                        'change': round(change, 2),
-                        'change_percent': round(change_percent, 2)
-                    }
-                elif len(hist) == 1:
-                    current = hist['Close'].iloc[-1]
-                    return {
-                        'price': round(current, 2),
-                        'change': 0,
-                        'change_percent': 0
-                    }
-            except:
-                pass
-            return {'price': 0, 'change': 0, 'change_percent': 0}
-        
-        # Parallel fetching for speed - all indices fetched simultaneously
-        indices = {
-            'nifty': '^NSEI',
-            'sensex': '^BSESN',
-            'sp500': '^GSPC',
-            'nasdaq': '^IXIC',
-            'dow': '^DJI'
-        }
-        
-        results = {}
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_index = {executor.submit(get_index_data, symbol): name 
-                             for name, symbol in indices.items()}
-            
-            for future in as_completed(future_to_index):
-                index_name = future_to_index[future]
-                try:
-                    results[index_name] = future.result(timeout=3)  # 3 second timeout per index
-                except:
-                    results[index_name] = {'price': 0, 'change': 0, 'change_percent': 0}
-        
-        return jsonify({
-            'success': True,
-            'indian_market': {
-                'nifty': results.get('nifty', {'price': 0, 'change': 0, 'change_percent': 0}),
-                'sensex': results.get('sensex', {'price': 0, 'change': 0, 'change_percent': 0})
-            },
-            'international_market': {
-                'sp500': results.get('sp500', {'price': 0, 'change': 0, 'change_percent': 0}),
-                'nasdaq': results.get('nasdaq', {'price': 0, 'change': 0, 'change_percent': 0}),
-                'dow': results.get('dow', {'price': 0, 'change': 0, 'change_percent': 0})
-            }
-        })
+        with _market_lock:
+            body = _market_cache['body']
+        if body is None:
+            # First request before the refresher has finished its initial run
+            body = refresh_market_status()
+        response = app.response_class(body, mimetype='application/json')
+        response.json_success = True  # compute_market_status only returns successful payloads
+        return response
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
+        return jsonify_fast({'success': False, 'message': str(e)})
 
 @app.route('/api/stock/<symbol>')
 @login_required
+@cache_json(30, public=False)
 def get_stock_data(symbol):
     """Get detailed stock information - OPTIMIZED"""
     try:
-        stock = yf.Ticker(symbol)
-        
         # Fetch data in parallel
         def fetch_info():
             try:
-                return stock.info
+                return get_info_cached(symbol)
             except:
                 return {}
         
         def fetch_history():
             try:
-                return stock.history(period="6mo")  # Reduced from 1y to 6mo for faster loading
+                return get_history_cached(symbol, "6mo")  # Reduced from 1y to 6mo for faster loading
             except:
                 return pd.DataFrame()
         
@@ -470,7 +536,7 @@ def get_stock_data(symbol):
             hist = hist_future.result(timeout=5)
         
         if hist.empty:
-            return jsonify({'success': False, 'message': 'Stock not found or no data available'})
+            return jsonify_fast({'success': False, 'message': 'Stock not found or no data available'})
         
         # Calculate additional metrics
         current_price = hist['Close'].iloc[-1]
@@ -521,47 +587,50 @@ def get_stock_data(symbol):
             'currency': 'INR'
         }
         
-        return jsonify(stock_data)
+        return jsonify_fast(stock_data)
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
+        return jsonify_fast({'success': False, 'message': str(e)})
+
+# Periods long enough that history is streamed as NDJSON instead of one JSON document
+STREAM_PERIODS = {'5y', '10y', 'max'}
+
+# Long-lived pool so a timed-out fetch doesn't block the request on executor shutdown
+_history_executor = ThreadPoolExecutor(max_workers=8)
 
 @app.route('/api/stock/<symbol>/history')
 @login_required
+@cache_json(300, public=False)
 def get_stock_history(symbol):
     """Get historical stock data for charts - OPTIMIZED"""
     try:
         period = request.args.get('period', '6mo')  # Default to 6 months for faster loading
-        stock = yf.Ticker(symbol)
-        
-        # Fetch with timeout
-        import signal
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Stock history fetch timeout")
-        
-        # Set 10-second timeout (Windows compatible way)
-        start_time = time.time()
-        hist = stock.history(period=period)
-        
-        if time.time() - start_time > 10:
-            return jsonify({'success': False, 'message': 'Request timeout - please try again'})
+        # Fetch on a worker thread so a hung Yahoo request can't hold this one past 10 seconds
+        future = _history_executor.submit(get_history_cached, symbol, period)
+        try:
+            hist = future.result(timeout=10)
+        except FuturesTimeoutError:
+            return jsonify_fast({'success': False, 'message': 'Request timeout - please try again'})
         
         if hist.empty:
-            return jsonify({'success': False, 'message': 'No historical data available'})
+            return jsonify_fast({'success': False, 'message': 'No historical data available'})
         
         # Prepare data for charts
         dates = hist.index.strftime('%Y-%m-%d').tolist()
         
-        # Convert prices to INR if foreign stock
-        if is_indian_stock(symbol):
-            prices = hist['Close'].round(2).tolist()
-        else:
-            rate = get_usd_to_inr_rate()
-            prices = (hist['Close'] * rate).round(2).tolist()
+        # Convert prices to INR if foreign stock - arrays are serialized directly by orjson
+        rate = 1.0 if is_indian_stock(symbol) else get_usd_to_inr_rate()
+        prices = np.round(hist['Close'].to_numpy(dtype=np.float64) * rate, 2)
+        volumes = hist['Volume'].to_numpy(dtype=np.int64)
         
-        volumes = hist['Volume'].tolist()
+        if period in STREAM_PERIODS:
+            # Very long series are streamed one row per line so the client can start parsing immediately
+            def generate():
+                for i in range(len(dates)):
+                    yield orjson.dumps({'d': dates[i], 'p': prices[i], 'v': volumes[i]},
+                                       option=orjson.OPT_SERIALIZE_NUMPY) + b'\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
         
-        return jsonify({
+        return jsonify_fast({
             'success': True,
             'dates': dates,
             'prices': prices,
@@ -569,7 +638,7 @@ def get_stock_history(symbol):
             'currency': 'INR'
         })
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
+        return jsonify_fast({'success': False, 'message': str(e)})
 
 @app.route('/predict/<symbol>')
 @login_required
@@ -582,7 +651,9 @@ def predict_page(symbol):
 def predict_historical(symbol):
     """Get historical prediction for stock"""
     try:
-        model_type = request.args.get('model_type', 'standard')  # standard or advanced
+        model_type = request.args.get('model_type', 'standard')  # standard, advanced or fast
+        # Imported lazily so TensorFlow/sklearn only load when predictions are requested
+        from models.historical_predictor import HistoricalPredictor
         predictor = HistoricalPredictor(symbol)
         result = predictor.predict(days=14, model_type=model_type)
         
@@ -598,10 +669,11 @@ def predict_historical(symbol):
 def predict_sentiment(symbol):
     """Get sentiment analysis prediction for stock"""
     try:
+        from models.sentiment_analyzer import SentimentAnalyzer
         analyzer = SentimentAnalyzer(symbol)
         result = analyzer.analyze()
         
-        response = jsonify(result)
+        response = jsonify_fast(result)
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
@@ -614,9 +686,10 @@ def predict_sentiment(symbol):
 def predict_hybrid(symbol):
     """Get hybrid prediction combining historical and sentiment analysis"""
     try:
+        from models.hybrid_predictor import HybridPredictor
         predictor = HybridPredictor(symbol)
         result = predictor.predict(days=14)
-        return jsonify(result)
+        return jsonify_fast(result)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -630,24 +703,40 @@ def watchlist_page():
 @login_required
 def manage_watchlist():
     """Manage user watchlist"""
-    users = load_users()
-    user = next((u for u in users if u['email'] == session['user_email']), None)
+    user = get_user(session['user_email'])
     
     if not user:
         return jsonify({'success': False, 'message': 'User not found'})
     
+    # Every read-modify-write of the shared user store below happens under _USERS_LOCK;
+    # name lookups (network calls) are done before taking it
     if request.method == 'GET':
-        # Get watchlist with current prices - OPTIMIZED with parallel fetching
-        watchlist = user.get('watchlist', [])
+        # Get watchlist with current prices - one batched download for all symbols
+        with _USERS_LOCK:
+            watchlist = list(user.get('watchlist', []))
         
-        def fetch_stock_data(symbol):
-            """Fetch stock data with timeout"""
-            try:
-                stock = yf.Ticker(symbol)
-                hist = stock.history(period="2d")
-                if not hist.empty:
-                    current_price = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2] if len(hist) >= 2 else current_price
+        # Backfill names for legacy bare-symbol entries once, then persist
+        if any(isinstance(item, str) for item in watchlist):
+            names = {item: resolve_company_name(item) for item in watchlist if isinstance(item, str)}
+            with _USERS_LOCK:
+                watchlist = [{'symbol': item, 'name': names.get(item, item)} if isinstance(item, str) else item
+                             for item in user.get('watchlist', [])]
+                user['watchlist'] = watchlist
+                save_users(load_users())
+        
+        symbols = [item['symbol'] for item in watchlist]
+        
+        watchlist_data = []
+        if symbols:
+            df = download_cached(symbols, period="2d")
+            for item in watchlist:
+                symbol = item['symbol']
+                try:
+                    closes = closes_from_download(df, symbol)
+                    if closes.empty:
+                        continue
+                    current_price = closes.iloc[-1]
+                    prev_close = closes.iloc[-2] if len(closes) >= 2 else current_price
                     change = current_price - prev_close
                     change_percent = (change / prev_close) * 100
                     
@@ -655,40 +744,17 @@ def manage_watchlist():
                     current_price_inr = convert_price_to_inr(current_price, symbol)
                     change_inr = convert_price_to_inr(change, symbol)
                     
-                    # Get name without calling .info (much faster)
-                    name = symbol
-                    try:
-                        info = stock.info
-                        name = info.get('longName', symbol)
-                    except:
-                        pass
-                    
-                    return {
+                    watchlist_data.append({
                         'symbol': symbol,
-                        'name': name,
+                        'name': item.get('name', symbol),
                         'price': round(current_price_inr, 2),
                         'change': round(change_inr, 2),
                         'change_percent': round(change_percent, 2)
-                    }
-            except:
-                pass
-            return None
-        
-        # Parallel fetch all watchlist stocks (max 10 at a time)
-        watchlist_data = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_symbol = {executor.submit(fetch_stock_data, symbol): symbol 
-                              for symbol in watchlist}
-            
-            for future in as_completed(future_to_symbol):
-                try:
-                    result = future.result(timeout=3)
-                    if result:
-                        watchlist_data.append(result)
+                    })
                 except:
                     continue
         
-        return jsonify({'success': True, 'watchlist': watchlist_data})
+        return jsonify_fast({'success': True, 'watchlist': watchlist_data})
     
     elif request.method == 'POST':
         # Add to watchlist
@@ -698,14 +764,21 @@ def manage_watchlist():
         if not symbol:
             return jsonify({'success': False, 'message': 'Symbol is required'})
         
-        if 'watchlist' not in user:
-            user['watchlist'] = []
+        def in_watchlist():
+            return any(watchlist_entry(item)['symbol'] == symbol for item in user.get('watchlist', []))
         
-        if symbol in user['watchlist']:
-            return jsonify({'success': False, 'message': 'Stock already in watchlist'})
+        with _USERS_LOCK:
+            if in_watchlist():
+                return jsonify({'success': False, 'message': 'Stock already in watchlist'})
         
-        user['watchlist'].append(symbol)
-        save_users(users)
+        # Resolve the company name once here so GET never needs .info
+        name = resolve_company_name(symbol)
+        with _USERS_LOCK:
+            # Re-check: another request may have added it while the name was looked up
+            if in_watchlist():
+                return jsonify({'success': False, 'message': 'Stock already in watchlist'})
+            user.setdefault('watchlist', []).append({'symbol': symbol, 'name': name})
+            save_users(load_users())
         
         return jsonify({'success': True, 'message': 'Added to watchlist'})
     
@@ -714,10 +787,13 @@ def manage_watchlist():
         data = request.json
         symbol = data.get('symbol', '').upper()
         
-        if symbol in user.get('watchlist', []):
-            user['watchlist'].remove(symbol)
-            save_users(users)
-            return jsonify({'success': True, 'message': 'Removed from watchlist'})
+        with _USERS_LOCK:
+            watchlist = user.get('watchlist', [])
+            for i, item in enumerate(watchlist):
+                if watchlist_entry(item)['symbol'] == symbol:
+                    del watchlist[i]
+                    save_users(load_users())
+                    return jsonify({'success': True, 'message': 'Removed from watchlist'})
         
         return jsonify({'success': False, 'message': 'Stock not in watchlist'})
 
@@ -731,78 +807,69 @@ def portfolio_page():
 @login_required
 def manage_portfolio():
     """Manage user portfolio"""
-    users = load_users()
-    user = next((u for u in users if u['email'] == session['user_email']), None)
+    user = get_user(session['user_email'])
     
     if not user:
         return jsonify({'success': False, 'message': 'User not found'})
     
     if request.method == 'GET':
-        # Get portfolio with current values - OPTIMIZED with parallel fetching
-        portfolio = user.get('portfolio', [])
-        
-        def fetch_portfolio_item(holding):
-            """Fetch portfolio item data with timeout"""
-            try:
-                symbol = holding['symbol']
-                stock = yf.Ticker(symbol)
-                hist = stock.history(period="1d")
-                if not hist.empty:
-                    current_price = hist['Close'].iloc[-1]
-                    quantity = holding['quantity']
-                    buy_price = holding['buy_price']
-                    
-                    # Convert current price to INR if foreign stock
-                    current_price_inr = convert_price_to_inr(current_price, symbol)
-                    
-                    # Note: buy_price is already stored in the currency user entered
-                    # For consistency, we assume buy_price was entered in INR
-                    current_value = current_price_inr * quantity
-                    invested_value = buy_price * quantity
-                    profit_loss = current_value - invested_value
-                    profit_loss_percent = (profit_loss / invested_value) * 100
-                    
-                    # Get name without calling .info (faster)
-                    name = symbol
-                    try:
-                        info = stock.info
-                        name = info.get('longName', symbol)
-                    except:
-                        pass
-                    
-                    return {
-                        'symbol': symbol,
-                        'name': name,
-                        'quantity': quantity,
-                        'buy_price': round(buy_price, 2),
-                        'current_price': round(current_price_inr, 2),
-                        'invested_value': round(invested_value, 2),
-                        'current_value': round(current_value, 2),
-                        'profit_loss': round(profit_loss, 2),
-                        'profit_loss_percent': round(profit_loss_percent, 2)
-                    }
-            except:
-                pass
-            return None
-        
-        # Parallel fetch all portfolio items (max 10 at a time)
-        portfolio_data = []
-        total_value = 0
-        total_invested = 0
-        
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_holding = {executor.submit(fetch_portfolio_item, holding): holding 
-                               for holding in portfolio}
-            
-            for future in as_completed(future_to_holding):
-                try:
-                    result = future.result(timeout=3)
-                    if result:
-                        portfolio_data.append(result)
-                        total_value += result['current_value']
-                        total_invested += result['invested_value']
-                except:
-                    continue
+        # Get portfolio with current values - OPTIMIZED with one batched download
+        con = get_db()
+        rows = con.execute(
+            'SELECT symbol, name, quantity, buy_price FROM portfolio WHERE user_id = ? ORDER BY rowid',
+            (user['email'],)
+        ).fetchall()
+        
+        # Hold the portfolio as parallel arrays (structure of arrays) for the valuation
+        symbols = [row[0] for row in rows]
+        names = [row[1] for row in rows]
+        quantities = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        buy_prices = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+        
+        # Backfill names for legacy holdings once, then persist
+        for i, name in enumerate(names):
+            if name is None:
+                names[i] = resolve_company_name(symbols[i])
+                con.execute('UPDATE portfolio SET name = ? WHERE user_id = ? AND symbol = ?',
+                            (names[i], user['email'], symbols[i]))
+        
+        # Cached per-symbol quotes, with one batched download for any that are stale
+        # (symbols are unique per user, guaranteed by the table's primary key)
+        prices = get_last_prices(symbols).to_numpy(dtype=np.float64)
+        
+        # Value every holding in one vectorized pass, skipping those without a quote
+        has_quote = ~np.isnan(prices)
+        prices = prices[has_quote]
+        quantities = quantities[has_quote]
+        buy_prices = buy_prices[has_quote]
+        quoted = np.flatnonzero(has_quote)
+        is_indian_mask = np.fromiter((is_indian_stock(symbols[i]) for i in quoted), dtype=bool, count=len(quoted))
+        
+        # Convert current prices to INR for foreign stocks
+        # Note: buy_price is already stored in the currency user entered
+        # For consistency, we assume buy_price was entered in INR
+        rate = get_usd_to_inr_rate() if not is_indian_mask.all() else 1.0
+        current_prices = prices * np.where(is_indian_mask, 1.0, rate)
+        current_values = current_prices * quantities
+        invested_values = buy_prices * quantities
+        profit_losses = current_values - invested_values
+        profit_loss_percents = profit_losses / invested_values * 100
+        
+        total_value = float(current_values.sum())
+        total_invested = float(invested_values.sum())
+        
+        # Only materialize per-holding dicts for the JSON response
+        portfolio_data = [{
+            'symbol': symbols[i],
+            'name': names[i],
+            'quantity': rows[i][2],
+            'buy_price': round(rows[i][3], 2),
+            'current_price': round(float(current_prices[j]), 2),
+            'invested_value': round(float(invested_values[j]), 2),
+            'current_value': round(float(current_values[j]), 2),
+            'profit_loss': round(float(profit_losses[j]), 2),
+            'profit_loss_percent': round(float(profit_loss_percents[j]), 2)
+        } for j, i in enumerate(quoted)]
         
         total_profit_loss = total_value - total_invested
         total_profit_loss_percent = (total_profit_loss / total_invested * 100) if total_invested > 0 else 0
@@ -828,17 +895,8 @@ def manage_portfolio():
         if not symbol or quantity <= 0 or buy_price <= 0:
             return jsonify({'success': False, 'message': 'Invalid data'})
         
-        if 'portfolio' not in user:
-            user['portfolio'] = []
-        
-        user['portfolio'].append({
-            'symbol': symbol,
-            'quantity': quantity,
-            'buy_price': buy_price,
-            'date': datetime.now().isoformat()
-        })
-        
-        save_users(users)
+        add_holding(user['email'], symbol, resolve_company_name(symbol),
+                    quantity, buy_price, datetime.now().isoformat())
         
         return jsonify({'success': True, 'message': 'Added to portfolio'})
     
@@ -847,9 +905,9 @@ def manage_portfolio():
         data = request.json
         symbol = data.get('symbol', '').upper()
         
-        if 'portfolio' in user:
-            user['portfolio'] = [h for h in user['portfolio'] if h['symbol'] != symbol]
-            save_users(users)
+        deleted = get_db().execute('DELETE FROM portfolio WHERE user_id = ? AND symbol = ?',
+                                   (user['email'], symbol)).rowcount
+        if deleted:
             return jsonify({'success': True, 'message': 'Removed from portfolio'})
         
         return jsonify({'success': False, 'message': 'Stock not in portfolio'})
@@ -0,0 +1,178 @@
+"""
+Short-lived in-process caches for Yahoo Finance data
+Quotes change at most every few seconds, so repeat views within the TTL
+window are served from memory instead of hitting Yahoo again
+"""
+import os
+import time
+import hashlib
+import threading
+from datetime import date
+from cachetools import TTLCache
+import yfinance as yf
+import pandas as pd
+
+# Short periods are live quotes; longer periods are historical series
+QUOTE_PERIODS = {'1d', '2d', '3d', '5d'}
+
+_quote_cache = TTLCache(maxsize=2048, ttl=30)        # 30 seconds
+_history_cache = TTLCache(maxsize=512, ttl=3600)     # 1 hour
+_info_cache = TTLCache(maxsize=2048, ttl=21600)      # 6 hours
+_last_price_cache = TTLCache(maxsize=4096, ttl=30)   # 30 seconds, keyed by symbol
+_news_cache = TTLCache(maxsize=512, ttl=300)         # 5 minutes
+# Ticker objects memoize .news/.info internally, so they live no longer than the shortest data TTL
+_ticker_pool = TTLCache(maxsize=1024, ttl=300)       # 5 minutes
+_lock = threading.Lock()
+
+# Historical series are also kept on disk so restarts and other processes reuse them
+CACHE_DIR = os.path.join('.cache', 'history')
+HISTORY_TTL = 3600             # Same freshness as the in-memory history cache
+DISK_MAX_AGE = 2 * 86400       # Files older than 2 days are purged
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# Caps concurrent Yahoo requests so bursts don't trigger rate-limit 429s
+YF_SEM = threading.BoundedSemaphore(16)
+
+def get_ticker(symbol):
+    """Shared yf.Ticker for a symbol, so its session and lazily loaded state are reused across calls"""
+    with _lock:
+        ticker = _ticker_pool.get(symbol)
+        if ticker is None:
+            ticker = _ticker_pool[symbol] = yf.Ticker(symbol)
+    return ticker
+
+def _cache_for_period(period):
+    """Pick the cache matching how quickly data for this period goes stale"""
+    return _quote_cache if period in QUOTE_PERIODS else _history_cache
+
+def _has_rows(df):
+    """yfinance reports failed or rate-limited requests as empty (or all-NaN) frames rather than raising"""
+    return df is not None and not df.dropna(how='all').empty
+
+def _has_info(info):
+    """A failed .info lookup comes back empty or with only a few stray keys and no price or name"""
+    return bool(info) and any(key in info for key in ('regularMarketPrice', 'currentPrice', 'shortName', 'longName'))
+
+def _get_or_fill(cache, key, loader, should_cache=None):
+    """
+    Return cached value for key, calling loader() to fill it on a miss
+    Results failing should_cache are returned but not stored, so the next call retries
+    """
+    with _lock:
+        if key in cache:
+            return cache[key]
+    value = loader()
+    if should_cache is None or should_cache(value):
+        with _lock:
+            cache[key] = value
+    return value
+
+def _history_path(symbol, period):
+    """Disk cache file for a symbol/period, keyed by today's date"""
+    key = hashlib.md5(f"{symbol}:{period}:{date.today()}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+def load_history_from_disk(symbol, period):
+    """Get stock history from the disk cache if fresh, otherwise download and store it"""
+    path = _history_path(symbol, period)
+    try:
+        if time.time() - os.path.getmtime(path) < HISTORY_TTL:
+            return pd.read_pickle(path)
+    except Exception:
+        pass
+    
+    with YF_SEM:
+        df = get_ticker(symbol).history(period=period)
+    
+    if _has_rows(df):
+        try:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            df.to_pickle(tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Error caching history for {symbol}: {str(e)}")
+    return df
+
+def _purge_history_files():
+    """Background thread that deletes stale history files once a day"""
+    while True:
+        cutoff = time.time() - DISK_MAX_AGE
+        try:
+            for name in os.listdir(CACHE_DIR):
+                path = os.path.join(CACHE_DIR, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except Exception as e:
+            print(f"Error purging history cache: {str(e)}")
+        time.sleep(86400)
+
+threading.Thread(target=_purge_history_files, daemon=True).start()
+
+def get_history_cached(symbol, period):
+    """Get stock.history(period=...) for a symbol, cached by (symbol, period)"""
+    def loader():
+        if period not in QUOTE_PERIODS:
+            return load_history_from_disk(symbol, period)
+        with YF_SEM:
+            return get_ticker(symbol).history(period=period)
+    hist = _get_or_fill(_cache_for_period(period), (symbol, period), loader, _has_rows)
+    # Callers may add columns, so hand out a copy of the cached frame
+    return hist.copy()
+
+def get_info_cached(symbol):
+    """Get stock.info for a symbol, cached for several hours"""
+    def loader():
+        with YF_SEM:
+            return get_ticker(symbol).info
+    return _get_or_fill(_info_cache, symbol, loader, _has_info)
+
+def get_news_cached(symbol):
+    """Get stock.news for a symbol, cached for a few minutes"""
+    def loader():
+        with YF_SEM:
+            return get_ticker(symbol).news
+    # An empty list is usually a failed or rate-limited request, so it isn't kept
+    return _get_or_fill(_news_cache, symbol, loader, bool)
+
+def download_cached(symbols, period):
+    """Batched yf.download for several symbols, cached by (symbols, period)"""
+    key = (tuple(symbols), period)
+    def loader():
+        with YF_SEM:
+            return yf.download(list(symbols), period=period, group_by='ticker',
+                               progress=False, threads=True)
+    return _get_or_fill(_cache_for_period(period), key, loader, _has_rows).copy()
+
+def closes_from_download(df, symbol):
+    """Close series for one symbol from a yf.download frame (flat columns when only one symbol)"""
+    if isinstance(df.columns, pd.MultiIndex):
+        return df[symbol]['Close'].dropna()
+    return df['Close'].dropna()
+
+def last_closes_from_download(df, symbols):
+    """Latest close per symbol from a yf.download frame as a Series, NaN where there is no quote"""
+    if df is None or df.empty:
+        return pd.Series(float('nan'), index=symbols)
+    if isinstance(df.columns, pd.MultiIndex):
+        closes = df.xs('Close', axis=1, level=1)
+    else:
+        closes = df[['Close']].set_axis(list(symbols)[:1], axis=1)
+    return closes.ffill().iloc[-1].reindex(symbols)
+
+def get_last_prices(symbols):
+    """Latest price per symbol as a Series, downloading only symbols not quoted in the last 30s"""
+    symbols = list(symbols)
+    with _lock:
+        prices = {s: _last_price_cache[s] for s in symbols if s in _last_price_cache}
+    
+    missing = [s for s in symbols if s not in prices]
+    if missing:
+        with YF_SEM:
+            df = yf.download(missing, period='1d', group_by='ticker', progress=False, threads=True)
+        fresh = last_closes_from_download(df, missing).dropna()
+        with _lock:
+            for symbol, price in fresh.items():
+                _last_price_cache[symbol] = price
+        prices.update(fresh.to_dict())
+    
+    return pd.Series(prices, dtype='float64').reindex(symbols)
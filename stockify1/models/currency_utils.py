@@ -2,90 +2,138 @@
 Currency conversion utilities for stock prices
 Fetches real-time exchange rates from multiple sources
 """
-import yfinance as yf
+import os
+import json
+import threading
+import time
+import numpy as np
 from datetime import datetime
-import requests
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from models.http_utils import SESSION, yahoo_last_price
 
 # Currency conversion cache
 USD_TO_INR_RATE = None  # Will be fetched from live sources
 LAST_RATE_UPDATE = None
+RATE_TTL = 3600          # A provider quote is reused for 1 hour
+FALLBACK_RATE = 83.0     # Emergency value when no provider answers; never cached to disk
+FALLBACK_RETRY = 300     # While on a fallback, query the providers again after 5 minutes
+_next_refresh = 0.0
+_rate_lock = threading.Lock()
 
-def fetch_live_exchange_rate():
-    """Fetch live USD to INR exchange rate from multiple sources"""
-    
-    # Method 1: Try Yahoo Finance (most reliable)
-    try:
-        usd_inr = yf.Ticker("USDINR=X")
-        hist = usd_inr.history(period="1d")
-        if not hist.empty:
-            rate = hist['Close'].iloc[-1]
-            if rate > 70 and rate < 100:  # Sanity check
-                return rate
-    except:
-        pass
-    
-    # Method 2: Try using INR=X alternative ticker
+# Last fetched rate is kept on disk so restarts don't have to query the providers again
+FX_PATH = os.path.join(os.path.expanduser('~'), '.stockify', 'fx.json')
+
+def load_cached_rate():
+    """Read (rate, fetched_at) from the on-disk rate file, or (None, None) if missing or unreadable"""
     try:
-        inr = yf.Ticker("INR=X")
-        hist = inr.history(period="1d")
-        if not hist.empty:
-            rate = 1 / hist['Close'].iloc[-1]
-            if rate > 70 and rate < 100:
-                return rate
-    except:
-        pass
-    
-    # Method 3: Try exchangerate-api.com (free tier)
+        with open(FX_PATH) as f:
+            data = json.load(f)
+        return float(data['rate']), datetime.fromtimestamp(data['ts'])
+    except Exception:
+        return None, None
+
+def save_cached_rate(rate, fetched_at):
+    """Write the rate and its fetch time to the on-disk rate file"""
     try:
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get('INR')
-            if rate and rate > 70 and rate < 100:
-                return rate
-    except:
-        pass
-    
-    # Method 4: Try frankfurter.app (European Central Bank data)
+        os.makedirs(os.path.dirname(FX_PATH), exist_ok=True)
+        tmp = f"{FX_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'rate': float(rate), 'ts': fetched_at.timestamp()}, f)
+        os.replace(tmp, FX_PATH)
+    except Exception as e:
+        print(f"Error saving exchange rate: {str(e)}")
+
+def _probe_yahoo():
+    """Yahoo Finance USDINR=X (most reliable)"""
+    return yahoo_last_price("USDINR=X")
+
+def _probe_inrx():
+    """INR=X alternative ticker (already quoted as INR per USD)"""
+    return yahoo_last_price("INR=X")
+
+def _probe_erapi():
+    """exchangerate-api.com (free tier)"""
+    response = SESSION.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=5)
+    if response.status_code == 200:
+        return response.json()['rates'].get('INR')
+    return None
+
+def _probe_frankfurter():
+    """frankfurter.app (European Central Bank data)"""
+    response = SESSION.get("https://api.frankfurter.app/latest?from=USD&to=INR", timeout=5)
+    if response.status_code == 200:
+        return response.json()['rates'].get('INR')
+    return None
+
+_PROVIDERS = [_probe_yahoo, _probe_inrx, _probe_erapi, _probe_frankfurter]
+# Long-lived pool so slow providers never hold the caller past the deadline
+_provider_executor = ThreadPoolExecutor(max_workers=len(_PROVIDERS))
+
+def fetch_live_exchange_rate():
+    """Fetch live USD to INR exchange rate, returning the first valid answer from all sources queried at once"""
+    futures = [_provider_executor.submit(probe) for probe in _PROVIDERS]
     try:
-        response = requests.get("https://api.frankfurter.app/latest?from=USD&to=INR", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get('INR')
-            if rate and rate > 70 and rate < 100:
-                return rate
-    except:
+        for future in as_completed(futures, timeout=5):
+            try:
+                rate = future.result()
+                if rate and rate > 70 and rate < 100:  # Sanity check
+                    for other in futures:
+                        other.cancel()
+                    return rate
+            except:
+                pass
+    except FuturesTimeoutError:
         pass
     
-    # Emergency fallback only
-    return 83.0
+    # No provider answered; the caller decides what to fall back to
+    return None
 
 def get_usd_to_inr_rate():
     """Get current USD to INR exchange rate with caching"""
-    global USD_TO_INR_RATE, LAST_RATE_UPDATE
-    
-    # Update rate every 1 hour (3600 seconds)
-    current_time = datetime.now()
-    should_update = (
-        USD_TO_INR_RATE is None or 
-        LAST_RATE_UPDATE is None or 
-        (current_time - LAST_RATE_UPDATE).total_seconds() > 3600
-    )
+    global USD_TO_INR_RATE, LAST_RATE_UPDATE, _next_refresh
     
-    if should_update:
+    # The lock keeps concurrent callers from all refreshing the rate at once
+    with _rate_lock:
+        if USD_TO_INR_RATE is not None and time.time() < _next_refresh:
+            return USD_TO_INR_RATE
+        
+        # Pick up a rate saved by a previous run (or by app.py) before querying the providers
+        cached_rate, cached_at = load_cached_rate()
+        if cached_rate is not None and time.time() - cached_at.timestamp() < RATE_TTL:
+            USD_TO_INR_RATE, LAST_RATE_UPDATE = cached_rate, cached_at
+            _next_refresh = cached_at.timestamp() + RATE_TTL
+            return USD_TO_INR_RATE
+        
+        current_time = datetime.now()
+        rate = None
         try:
-            USD_TO_INR_RATE = fetch_live_exchange_rate()
-            LAST_RATE_UPDATE = current_time
-        except:
+            rate = fetch_live_exchange_rate()
+        except Exception as e:
+            print(f"Error updating exchange rate: {str(e)}")
+        
+        if rate is not None:
+            USD_TO_INR_RATE, LAST_RATE_UPDATE = rate, current_time
+            _next_refresh = current_time.timestamp() + RATE_TTL
+            save_cached_rate(rate, current_time)
+        else:
+            # Only provider quotes are persisted; keep the last real rate if there is one
             if USD_TO_INR_RATE is None:
-                USD_TO_INR_RATE = 83.0  # Only use fallback if never fetched
-    
-    return USD_TO_INR_RATE
+                USD_TO_INR_RATE = FALLBACK_RATE
+            _next_refresh = time.time() + FALLBACK_RETRY
+        
+        return USD_TO_INR_RATE
 
+_INDIAN_SUFFIXES = ('.NS', '.BO', '.BSE', '.NSE')
+
+@lru_cache(maxsize=4096)
 def is_indian_stock(symbol):
     """Check if stock is Indian (NSE/BSE) or foreign (mainly US)"""
-    indian_suffixes = ['.NS', '.BO', '.BSE', '.NSE']
-    return any(symbol.upper().endswith(suffix) for suffix in indian_suffixes)
+    return symbol.upper().endswith(_INDIAN_SUFFIXES)
+
+def get_inr_rate(symbol):
+    """Multiplier that converts this symbol's prices to INR (1.0 for Indian stocks)"""
+    return 1.0 if is_indian_stock(symbol) else get_usd_to_inr_rate()
 
 def convert_price_to_inr(price, symbol):
     """Convert price to INR if it's a foreign stock"""
@@ -103,5 +151,6 @@ def convert_prices_array_to_inr(prices, symbol):
         return prices
     else:
         rate = get_usd_to_inr_rate()
-        return [price * rate for price in prices]
+        converted = np.multiply(prices, rate, dtype=np.float64)
+        return converted.tolist() if isinstance(prices, list) else converted
 
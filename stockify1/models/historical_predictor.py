@@ -1,14 +1,72 @@
+import os
+import time
+import threading
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')  # Skip TensorFlow's startup banner/info logs
 import numpy as np
+import bottleneck as bn
 import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, Attention, Layer
 from tensorflow.keras.callbacks import EarlyStopping
 import tensorflow as tf
+import hashlib
+import re
+import joblib
+import lightgbm as lgb
+from cachetools import TTLCache
 from models.currency_utils import convert_price_to_inr, convert_prices_array_to_inr
+from models.cache_utils import get_history_cached
+
+# The models are tiny, so a couple of op threads avoid oversubscribing the CPU,
+# and XLA fuses the LSTM cell ops into fewer kernels
+try:
+    tf.config.threading.set_intra_op_parallelism_threads(2)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+except RuntimeError:
+    pass  # Thread pools can't change once TensorFlow has initialized
+tf.config.optimizer.set_jit(True)
+
+# Trained weights and scalers are persisted per symbol/model type for the current day
+MODEL_CACHE_DIR = os.path.join('.cache', 'models')
+MODEL_MAX_AGE = 2 * 86400      # Only today's files are loaded; anything older than 2 days is purged
+os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+
+def _tmp_path(path):
+    """Per-process/thread temp name next to path, keeping its extension (Keras checks the .weights.h5 suffix)"""
+    base, ext = (path[:-len('.weights.h5')], '.weights.h5') if path.endswith('.weights.h5') else os.path.splitext(path)
+    return f"{base}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+
+def _atomic_dump(obj, path):
+    """joblib.dump to a temp file and move it into place, so readers never see a torn file"""
+    tmp = _tmp_path(path)
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+def _atomic_save_weights(model, path):
+    """model.save_weights to a temp file and move it into place"""
+    tmp = _tmp_path(path)
+    model.save_weights(tmp)
+    os.replace(tmp, path)
+
+def _purge_model_files():
+    """Background thread that deletes stale model files once a day"""
+    while True:
+        cutoff = time.time() - MODEL_MAX_AGE
+        try:
+            for name in os.listdir(MODEL_CACHE_DIR):
+                path = os.path.join(MODEL_CACHE_DIR, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except Exception as e:
+            print(f"Error purging model cache: {str(e)}")
+        time.sleep(86400)
+
+threading.Thread(target=_purge_model_files, daemon=True).start()
+
+# Quantized TFLite flatbuffers keyed by a fingerprint of the trained weights
+_TFLITE_CACHE = TTLCache(maxsize=64, ttl=86400)
 
 class HistoricalPredictor:
     """
@@ -19,51 +77,64 @@ class HistoricalPredictor:
 
     def __init__(self, symbol):
         self.symbol = symbol
-        self.scaler = MinMaxScaler()
+        # Per-feature min/max for scaling to [0, 1]
+        self._mn = None
+        self._mx = None
 
     def prepare_features(self, df):
         """Prepare multiple features from historical data"""
-        df['MA_7'] = df['Close'].rolling(window=7).mean()
-        df['MA_21'] = df['Close'].rolling(window=21).mean()
-        df['MA_50'] = df['Close'].rolling(window=50).mean()
+        # Rolling windows run on the raw ndarrays with bottleneck's O(n) sliding kernels
+        close = df['Close'].to_numpy(dtype=np.float64)
+        volume = df['Volume'].to_numpy(dtype=np.float64)
+
+        df['MA_7'] = bn.move_mean(close, 7)
+        df['MA_21'] = bn.move_mean(close, 21)
+        df['MA_50'] = bn.move_mean(close, 50)
 
         # RSI
-        delta = df['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        delta = np.diff(close, prepend=np.nan)
+        gain = bn.move_mean(np.where(delta > 0, delta, 0.0), 14)
+        loss = bn.move_mean(np.where(delta < 0, -delta, 0.0), 14)
         # Avoid division by zero in RSI calculation
-        rs = gain / loss.replace(0, 0.001)  # Replace 0 with small value to avoid division by zero
+        rs = gain / np.where(loss == 0, 0.001, loss)  # Replace 0 with small value to avoid division by zero
         df['RSI'] = 100 - (100 / (1 + rs))
 
-        # MACD
+        # MACD (pandas ewm is already a single-pass recurrence)
         exp1 = df['Close'].ewm(span=12, adjust=False).mean()
         exp2 = df['Close'].ewm(span=26, adjust=False).mean()
         df['MACD'] = exp1 - exp2
         df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
 
         # Bollinger Bands
-        df['BB_Middle'] = df['Close'].rolling(window=20).mean()
-        bb_std = df['Close'].rolling(window=20).std()
-        df['BB_Upper'] = df['BB_Middle'] + (bb_std * 2)
-        df['BB_Lower'] = df['BB_Middle'] - (bb_std * 2)
+        bb_middle = bn.move_mean(close, 20)
+        bb_std = bn.move_std(close, 20, ddof=1)
+        df['BB_Middle'] = bb_middle
+        df['BB_Upper'] = bb_middle + (bb_std * 2)
+        df['BB_Lower'] = bb_middle - (bb_std * 2)
 
         # Volume & volatility
-        df['Volume_MA'] = df['Volume'].rolling(window=20).mean()
+        volume_ma = bn.move_mean(volume, 20)
+        df['Volume_MA'] = volume_ma
         # Avoid division by zero in volume ratio calculation
-        df['Volume_Ratio'] = df['Volume'] / df['Volume_MA'].replace(0, 1)  # Replace 0 with 1 to avoid division by zero
-        df['Momentum'] = df['Close'] - df['Close'].shift(10)
-        df['Volatility'] = df['Close'].rolling(window=10).std()
+        df['Volume_Ratio'] = volume / np.where(volume_ma == 0, 1, volume_ma)  # Replace 0 with 1 to avoid division by zero
+        momentum = np.full_like(close, np.nan)
+        momentum[10:] = close[10:] - close[:-10]
+        df['Momentum'] = momentum
+        df['Volatility'] = bn.move_std(close, 10, ddof=1)
 
         df = df.dropna()
         return df
 
     def create_sequences(self, data, sequence_length=60):
         """Create input sequences and labels for LSTM"""
-        X, y = [], []
-        for i in range(sequence_length, len(data)):
-            X.append(data[i-sequence_length:i])
-            y.append(data[i, 0])  # Predict Close
-        return np.array(X), np.array(y)
+        n_features = data.shape[1]
+        if len(data) <= sequence_length:
+            return np.empty((0, sequence_length, n_features), dtype=np.float32), np.empty(0, dtype=np.float32)
+        # Zero-copy windows over data, materialized once into a contiguous float32 tensor
+        windows = np.lib.stride_tricks.sliding_window_view(data, (sequence_length, n_features))
+        X = windows[:-1, 0].astype(np.float32)
+        y = data[sequence_length:, 0].astype(np.float32)  # Predict Close
+        return X, y
 
     def build_lstm_model(self, input_shape):
         """Define the standard LSTM model"""
@@ -93,17 +164,108 @@ class HistoricalPredictor:
         model.compile(optimizer='adam', loss='mse', metrics=['mae'])
         return model
 
+    def train_fast_model(self, X_train, y_train):
+        """
+        Fit a gradient-boosted tree regressor on flattened (window x features) rows.
+        Returns the model and the number of boosting rounds kept after early stopping.
+        """
+        X_flat = X_train.reshape(len(X_train), -1)
+        val_split = int(0.95 * len(X_flat))
+        model = lgb.LGBMRegressor(n_estimators=200, num_leaves=31, learning_rate=0.05, verbose=-1)
+        model.fit(X_flat[:val_split], y_train[:val_split],
+                  eval_set=[(X_flat[val_split:], y_train[val_split:])],
+                  callbacks=[lgb.early_stopping(10, verbose=False)])
+        return model, model.best_iteration_ or model.n_estimators
+
+    def model_cache_paths(self, model_type):
+        """Weights, scaler/metadata and metrics summary paths for today's model of this symbol and type"""
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', self.symbol)
+        prefix = os.path.join(MODEL_CACHE_DIR, f"{safe_symbol}_{model_type}_{date.today().isoformat()}")
+        return prefix + '.weights.h5', prefix + '.meta.pkl', prefix + '.summary.pkl'
+
+    def predict_next_day_from_summary(self, model_type):
+        """
+        Next-day estimate from the latest close plus one day's share of the 10-day momentum,
+        reusing the error metrics of today's full training run. Returns None if there wasn't one.
+        """
+        try:
+            summary = joblib.load(self.model_cache_paths(model_type)[2])
+        except Exception:
+            return None
+
+        df = get_history_cached(self.symbol, '6mo')
+        if len(df) < 11:
+            return None
+        close = df['Close'].to_numpy(dtype=np.float64)
+        prediction = close[-1] + (close[-1] - close[-11]) / 10
+
+        mae = summary['mae']
+        confidence = max(0, min(100, (1 - mae / close[-1]) * 100)) if close[-1] > 0 else 50
+        model_info = dict(summary['model_info'], cache_hit=True)
+
+        return {
+            'success': True,
+            'historical_dates': df.index[-90:].strftime('%Y-%m-%d').tolist(),
+            'historical_prices': np.asarray(convert_prices_array_to_inr(close[-90:], self.symbol)).tolist(),
+            'prediction_dates': [(df.index[-1] + timedelta(days=1)).strftime('%Y-%m-%d')],
+            'predictions': [float(convert_price_to_inr(prediction, self.symbol))],
+            'mae': float(convert_price_to_inr(mae, self.symbol)),
+            'rmse': float(convert_price_to_inr(summary['rmse'], self.symbol)),
+            'r2_score': float(summary['r2_score']),
+            'confidence': float(confidence),
+            'current_price': float(convert_price_to_inr(close[-1], self.symbol)),
+            'features_used': summary['features_used'],
+            'model_info': model_info,
+            'model_type': model_type,
+            'currency': 'INR'
+        }
+
+    def build_tflite_infer(self, model):
+        """
+        Convert the trained model to a dynamic-range int8 TFLite interpreter
+        for the forecast loop. Conversions are reused while the weights are unchanged.
+        """
+        digest = hashlib.md5()
+        for weights in model.get_weights():
+            digest.update(weights.tobytes())
+        key = digest.hexdigest()
+
+        tflite_model = _TFLITE_CACHE.get(key)
+        if tflite_model is None:
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            tflite_model = converter.convert()
+            _TFLITE_CACHE[key] = tflite_model
+
+        interpreter = tf.lite.Interpreter(model_content=tflite_model)
+        interpreter.allocate_tensors()
+        input_idx = interpreter.get_input_details()[0]['index']
+        output_idx = interpreter.get_output_details()[0]['index']
+
+        def infer(x):
+            interpreter.set_tensor(input_idx, x)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_idx)
+
+        return infer
+
     def predict(self, days=14, model_type='standard'):
         """
         Train LSTM and predict future stock prices
         
         Args:
             days (int): Number of days to predict
-            model_type (str): 'standard' for basic LSTM or 'advanced' for Bidirectional LSTM
+            model_type (str): 'standard' for basic LSTM, 'advanced' for Bidirectional LSTM
+                or 'fast' for a LightGBM regressor on the flattened window
         """
         try:
-            stock = yf.Ticker(self.symbol)
-            df = stock.history(period="2y")
+            # Tomorrow's price alone doesn't need a model run if one already ran today
+            if days <= 1:
+                quick = self.predict_next_day_from_summary(model_type)
+                if quick:
+                    return quick
+
+            df = get_history_cached(self.symbol, '2y')
 
             if df.empty:
                 print("No data found for symbol:", self.symbol)
@@ -119,8 +281,23 @@ class HistoricalPredictor:
             feature_columns = [col for col in feature_columns if col in df.columns]
             data = df[feature_columns].values
 
-            # Scale features
-            scaled_data = self.scaler.fit_transform(data)
+            # Reuse today's trained weights and scaler for this symbol/model if we have them
+            weights_path, meta_path, summary_path = self.model_cache_paths(model_type)
+            is_fast = model_type == 'fast'
+            # The fast model is pickled inside the meta file; LSTMs keep separate weights
+            cached = os.path.exists(meta_path) and (is_fast or os.path.exists(weights_path))
+            if cached:
+                meta = joblib.load(meta_path)
+                # Older cache files stored a sklearn scaler; retrain instead of using them
+                cached = 'mn' in meta and 'mx' in meta
+            if cached:
+                self._mn, self._mx = meta['mn'], meta['mx']
+            else:
+                self._mn = data.min(axis=0)
+                self._mx = data.max(axis=0)
+
+            # Scale features (plain min-max in one vectorized pass)
+            scaled_data = (data - self._mn) / (self._mx - self._mn + 1e-12)
             sequence_length = 30  # Reduced from 60 to 30 for faster processing
             X, y = self.create_sequences(scaled_data, sequence_length)
 
@@ -138,19 +315,52 @@ class HistoricalPredictor:
                 model = self.build_advanced_lstm_model((sequence_length, len(feature_columns)))
                 epochs = 10  # Ultra fast training
                 batch_size = 64  # Larger batch for speed
-                print(f"Training Advanced Bidirectional LSTM model...")
-            else:
+            elif not is_fast:
                 model = self.build_lstm_model((sequence_length, len(feature_columns)))
                 epochs = 8  # Ultra fast training
                 batch_size = 64  # Larger batch for speed
-                print(f"Training Standard LSTM model...")
-            
-            early_stop = EarlyStopping(monitor='loss', patience=2, restore_best_weights=True)
-            history = model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, 
-                              verbose=0, callbacks=[early_stop], validation_split=0.05)
+
+            if is_fast:
+                if cached:
+                    print(f"Loading cached fast LightGBM model for {self.symbol}...")
+                    model = meta['model']
+                    epochs_trained = meta['epochs_trained']
+                else:
+                    print("Training Fast LightGBM model...")
+                    model, epochs_trained = self.train_fast_model(X_train, y_train)
+                    try:
+                        _atomic_dump({'mn': self._mn, 'mx': self._mx, 'epochs_trained': epochs_trained,
+                                      'model': model}, meta_path)
+                    except Exception as e:
+                        print(f"Error caching model for {self.symbol}: {str(e)}")
+            elif cached:
+                print(f"Loading cached {model_type} LSTM model for {self.symbol}...")
+                if not model.built:
+                    model.build((None, sequence_length, len(feature_columns)))
+                model.load_weights(weights_path)
+                epochs_trained = meta['epochs_trained']
+            else:
+                print(f"Training {'Advanced Bidirectional' if model_type == 'advanced' else 'Standard'} LSTM model...")
+                early_stop = EarlyStopping(monitor='loss', patience=2, restore_best_weights=True)
+                # Hold out the last 5% up front and feed both splits through tf.data so
+                # batches are cached as tensors and prepared while the previous step runs
+                val_split = int(0.95 * len(X_train))
+                train_ds = (tf.data.Dataset.from_tensor_slices((X_train[:val_split], y_train[:val_split]))
+                            .cache().shuffle(1024).batch(batch_size).prefetch(tf.data.AUTOTUNE))
+                val_ds = (tf.data.Dataset.from_tensor_slices((X_train[val_split:], y_train[val_split:]))
+                          .batch(batch_size).cache().prefetch(tf.data.AUTOTUNE))
+                history = model.fit(train_ds, validation_data=val_ds, epochs=epochs,
+                                  verbose=0, callbacks=[early_stop])
+                epochs_trained = len(history.history['loss'])
+                try:
+                    # Weights land before the meta file that marks the pair as usable
+                    _atomic_save_weights(model, weights_path)
+                    _atomic_dump({'mn': self._mn, 'mx': self._mx, 'epochs_trained': epochs_trained}, meta_path)
+                except Exception as e:
+                    print(f"Error caching model for {self.symbol}: {str(e)}")
 
             # Evaluate
-            y_pred = model.predict(X_test)
+            y_pred = model.predict(X_test.reshape(len(X_test), -1) if is_fast else X_test)
             mae = mean_absolute_error(y_test, y_pred)
             mse = mean_squared_error(y_test, y_pred)
             rmse = np.sqrt(mse)
@@ -160,31 +370,50 @@ class HistoricalPredictor:
             print(f"Root Mean Squared Error: {rmse:.4f}")
             print(f"R² Score: {r2:.4f}")
 
-            # Predict future days
+            # Predict future days with the quantized TFLite model, falling back to a
+            # traced graph function - either avoids model.predict's per-call setup
+            n_features = len(feature_columns)
+            if is_fast:
+                # Each window is a contiguous slice of the ring buffer, so flattening is free
+                infer = lambda x: model.predict(x.reshape(1, -1)).reshape(1, 1)
+            else:
+                try:
+                    infer = self.build_tflite_infer(model)
+                except Exception as e:
+                    print(f"TFLite conversion failed, using TensorFlow: {str(e)}")
+                    graph_fn = tf.function(
+                        lambda x: model(x, training=False),
+                        input_signature=[tf.TensorSpec((1, sequence_length, n_features), tf.float32)]
+                    )
+                    infer = lambda x: graph_fn(tf.constant(x)).numpy()
             future_predictions = []
-            last_sequence = X[-1]
+            # Ring buffer stored twice over, so the current window is always the
+            # contiguous slice buf[idx:idx + sequence_length] - no per-day copies
+            buf = np.concatenate([X[-1], X[-1]]).astype(np.float32)
+            idx = 0
 
             for _ in range(days):
-                next_pred = model.predict(last_sequence.reshape(1, sequence_length, len(feature_columns)), verbose=0)[0][0]
-                new_row = np.copy(last_sequence[-1])
+                window = buf[idx:idx + sequence_length]
+                next_pred = float(infer(window[None])[0, 0])
+                new_row = window[-1].copy()
                 new_row[0] = next_pred  # update Close price with predicted value
-                last_sequence = np.vstack([last_sequence[1:], new_row])
+                buf[idx] = new_row
+                buf[idx + sequence_length] = new_row
+                idx = (idx + 1) % sequence_length
                 future_predictions.append(next_pred)
 
-            # Denormalize
-            dummy = np.zeros((len(future_predictions), scaled_data.shape[1]))
-            dummy[:, 0] = future_predictions
-            predictions_denorm = self.scaler.inverse_transform(dummy)[:, 0]
+            # Denormalize (Close is feature 0)
+            predictions_denorm = np.asarray(future_predictions) * (self._mx[0] - self._mn[0] + 1e-12) + self._mn[0]
 
             # Dates for visualization
             historical_dates = df.index[-90:].strftime('%Y-%m-%d').tolist()
-            historical_prices_raw = df['Close'].iloc[-90:].tolist()
+            historical_prices_raw = df['Close'].to_numpy()[-90:]
             last_date = df.index[-1]
             prediction_dates = [(last_date + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(days)]
 
             # Convert prices to INR if foreign stock
             historical_prices = convert_prices_array_to_inr(historical_prices_raw, self.symbol)
-            predictions_inr = convert_prices_array_to_inr(predictions_denorm.tolist(), self.symbol)
+            predictions_inr = convert_prices_array_to_inr(predictions_denorm, self.symbol)
             current_price_inr = convert_price_to_inr(df['Close'].iloc[-1], self.symbol)
             mae_inr = convert_price_to_inr(mae, self.symbol)
             rmse_inr = convert_price_to_inr(rmse, self.symbol)
@@ -198,19 +427,34 @@ class HistoricalPredictor:
                 confidence = 50  # Default confidence if current price is 0
             
             # Model architecture info
-            model_info = {
-                'type': model_type,
-                'layers': len(model.layers),
-                'total_params': model.count_params(),
-                'epochs_trained': len(history.history['loss'])
-            }
+            if is_fast:
+                model_info = {
+                    'type': model_type,
+                    'trees': model.booster_.num_trees(),
+                    'epochs_trained': epochs_trained
+                }
+            else:
+                model_info = {
+                    'type': model_type,
+                    'layers': len(model.layers),
+                    'total_params': model.count_params(),
+                    'epochs_trained': epochs_trained
+                }
+
+            # Keep today's metrics so next-day requests can skip the model entirely
+            if not os.path.exists(summary_path):
+                try:
+                    _atomic_dump({'mae': float(mae), 'rmse': float(rmse), 'r2_score': float(r2),
+                                  'model_info': model_info, 'features_used': feature_columns}, summary_path)
+                except Exception as e:
+                    print(f"Error caching metrics for {self.symbol}: {str(e)}")
 
             return {
                 'success': True,
                 'historical_dates': historical_dates,
-                'historical_prices': historical_prices,
+                'historical_prices': np.asarray(historical_prices).tolist(),
                 'prediction_dates': prediction_dates,
-                'predictions': predictions_inr,
+                'predictions': np.asarray(predictions_inr).tolist(),
                 'mae': float(mae_inr),
                 'rmse': float(rmse_inr),
                 'r2_score': float(r2),
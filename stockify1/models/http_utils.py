@@ -0,0 +1,30 @@
+"""
+Shared HTTP session for exchange-rate and scraping requests
+Reusing one pooled session avoids a fresh TCP+TLS handshake on every call
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from models.cache_utils import YF_SEM
+
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?interval=1d&range=1d"
+_YAHOO_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+def yahoo_last_price(symbol):
+    """Latest price for one symbol read straight from Yahoo's chart endpoint, without building a DataFrame"""
+    with YF_SEM:
+        response = SESSION.get(YAHOO_CHART_URL.format(symbol=symbol), headers=_YAHOO_HEADERS, timeout=5)
+    if response.status_code == 200:
+        price = response.json()['chart']['result'][0]['meta'].get('regularMarketPrice')
+        if price:
+            return float(price)
+    return None
@@ -1,8 +1,66 @@
 from models.historical_predictor import HistoricalPredictor
 from models.sentiment_analyzer import SentimentAnalyzer
 from models.currency_utils import convert_price_to_inr
+from models.cache_utils import get_info_cached, download_cached, closes_from_download
 import numpy as np
-import yfinance as yf
+import pandas as pd
+import bisect
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for sector peer lookups, which are independent Yahoo round-trips
+_peer_executor = ThreadPoolExecutor(max_workers=4)
+# Separate pool for the per-request model runs, so they never wait behind peer lookups they spawn
+_predict_executor = ThreadPoolExecutor(max_workers=8)
+
+# Upper bounds (exclusive) of each risk band and the level/recommendation/color for it
+_RISK_TABLE = (25, 40, 55, 70)
+_RISK_LEVELS = (
+    ('Low Risk', 'Strong Buy', '#10b981'),
+    ('Low-Medium Risk', 'Buy', '#22c55e'),
+    ('Medium Risk', 'Hold', '#f59e0b'),
+    ('Medium-High Risk', 'Sell', '#f97316'),
+    ('High Risk', 'Strong Sell', '#ef4444'),
+)
+
+# Mapping of sectors to major Indian and international companies
+_SECTOR_COMPANIES = {
+    'Technology': ('TCS.NS', 'INFY.NS', 'WIPRO.NS', 'AAPL', 'MSFT'),
+    'Financial Services': ('HDFCBANK.NS', 'ICICIBANK.NS', 'SBIN.NS', 'JPM', 'BAC'),
+    'Healthcare': ('SUNPHARMA.NS', 'DRREDDY.NS', 'JNJ', 'PFE'),
+    'Consumer Cyclical': ('MARUTI.NS', 'TATAMOTORS.NS', 'TSLA', 'AMZN'),
+    'Energy': ('RELIANCE.NS', 'ONGC.NS', 'XOM', 'CVX'),
+    'Industrials': ('LT.NS', 'BHARTIARTL.NS', 'BA', 'CAT'),
+    'Basic Materials': ('TATASTEEL.NS', 'HINDALCO.NS', 'BHP'),
+    'Consumer Defensive': ('ITC.NS', 'HINDUNILVR.NS', 'PG', 'KO'),
+    'Communication Services': ('BHARTIARTL.NS', 'T', 'VZ', 'META'),
+    'Real Estate': ('DLF.NS', 'GODREJPROP.NS', 'AMT'),
+    'Utilities': ('NTPC.NS', 'POWERGRID.NS', 'NEE')
+}
+
+_RISK_FACTOR_NAMES = ('Model Accuracy Risk', 'Sentiment Volatility', 'Price Volatility', 'Market Uncertainty')
+
+def risk_factor_scores(mae, sentiment_score, price_change_percent, confidence):
+    """
+    Risk points per factor for one or many stocks at once, as an (n, 4) array ordered
+    like _RISK_FACTOR_NAMES. Arguments may be scalars or equal-length arrays.
+    """
+    mae = np.atleast_1d(np.asarray(mae, dtype=np.float64))
+    sentiment_score = np.atleast_1d(np.asarray(sentiment_score, dtype=np.float64))
+    price_change_percent = np.atleast_1d(np.asarray(price_change_percent, dtype=np.float64))
+    confidence = np.atleast_1d(np.asarray(confidence, dtype=np.float64))
+    return np.column_stack(np.broadcast_arrays(
+        np.minimum(mae * 10, 30),                         # Historical model accuracy, max 30 points
+        np.abs(50 - sentiment_score) / 2,                 # Sentiment volatility, max 25 points
+        np.minimum(np.abs(price_change_percent) * 2, 25), # Price volatility, max 25 points
+        (100 - confidence) / 5                            # Market uncertainty, max 20 points
+    ))
+
+# Numeric fields of each sector peer entry
+_PEER_FIELDS = ('current_price', 'change_percent', 'predicted_price', 'predicted_change')
 
 class HybridPredictor:
     """
@@ -19,6 +77,7 @@ class HybridPredictor:
         """
         Combine historical and sentiment predictions using weighted average
         Weights are determined by model confidence and accuracy
+        Returns the combined predictions as an ndarray, both weights and mean/min/max stats
         """
         # Calculate weights based on model performance
         # Historical model weight based on MAE (lower MAE = higher weight)
@@ -43,73 +102,41 @@ class HybridPredictor:
         
         # Handle case where one model has no predictions
         if not historical_predictions and not sentiment_predictions:
-            return [], historical_weight, sentiment_weight
+            return np.empty(0), historical_weight, sentiment_weight, None
         
         if not historical_predictions:
-            return sentiment_predictions, 0, 1.0
-        
-        if not sentiment_predictions:
-            return historical_predictions, 1.0, 0
-        
-        combined_predictions = []
-        for i in range(min(len(historical_predictions), len(sentiment_predictions))):
-            combined = (historical_predictions[i] * historical_weight + 
-                       sentiment_predictions[i] * sentiment_weight)
-            combined_predictions.append(round(combined, 2))
+            historical_weight, sentiment_weight = 0, 1.0
+            combined = np.asarray(sentiment_predictions, dtype=np.float64)
+        elif not sentiment_predictions:
+            historical_weight, sentiment_weight = 1.0, 0
+            combined = np.asarray(historical_predictions, dtype=np.float64)
+        else:
+            n = min(len(historical_predictions), len(sentiment_predictions))
+            h = np.asarray(historical_predictions[:n], dtype=np.float64)
+            s = np.asarray(sentiment_predictions[:n], dtype=np.float64)
+            combined = np.round(h * historical_weight + s * sentiment_weight, 2)
         
-        return combined_predictions, historical_weight, sentiment_weight
+        # Summary stats come from the same array, so predict() doesn't rescan the list
+        stats = {'mean': float(combined.mean()), 'min': float(combined.min()), 'max': float(combined.max())}
+        return combined, historical_weight, sentiment_weight, stats
     
     def calculate_risk_score(self, historical_result, sentiment_result, price_change_percent):
         """
         Calculate risk score (0-100) and provide investment recommendation
         Lower score = Lower risk, Higher score = Higher risk
         """
-        risk_factors = []
-        
-        # Factor 1: Historical Model Accuracy (MAE)
         mae = historical_result.get('mae', 0)
-        mae_risk = min(mae * 10, 30)  # Max 30 points
-        risk_factors.append(('Model Accuracy Risk', mae_risk))
-        
-        # Factor 2: Sentiment Volatility
         sentiment_score = sentiment_result.get('sentiment_score', 50)
-        sentiment_risk = abs(50 - sentiment_score) / 2  # Max 25 points
-        risk_factors.append(('Sentiment Volatility', sentiment_risk))
-        
-        # Factor 3: Price Volatility
-        volatility = abs(price_change_percent)
-        volatility_risk = min(volatility * 2, 25)  # Max 25 points
-        risk_factors.append(('Price Volatility', volatility_risk))
-        
-        # Factor 4: Market Sentiment Confidence
         confidence = sentiment_result.get('confidence', 50)
-        confidence_risk = (100 - confidence) / 5  # Max 20 points
-        risk_factors.append(('Market Uncertainty', confidence_risk))
+        
+        scores = risk_factor_scores(mae, sentiment_score, price_change_percent, confidence)[0]
+        risk_factors = list(zip(_RISK_FACTOR_NAMES, scores.tolist()))
         
         # Calculate total risk score
-        total_risk = sum([factor[1] for factor in risk_factors])
+        total_risk = float(scores.sum())
         
         # Determine risk level and recommendation
-        if total_risk < 25:
-            risk_level = 'Low Risk'
-            recommendation = 'Strong Buy'
-            risk_color = '#10b981'
-        elif total_risk < 40:
-            risk_level = 'Low-Medium Risk'
-            recommendation = 'Buy'
-            risk_color = '#22c55e'
-        elif total_risk < 55:
-            risk_level = 'Medium Risk'
-            recommendation = 'Hold'
-            risk_color = '#f59e0b'
-        elif total_risk < 70:
-            risk_level = 'Medium-High Risk'
-            recommendation = 'Sell'
-            risk_color = '#f97316'
-        else:
-            risk_level = 'High Risk'
-            recommendation = 'Strong Sell'
-            risk_color = '#ef4444'
+        risk_level, recommendation, risk_color = _RISK_LEVELS[bisect.bisect_right(_RISK_TABLE, total_risk)]
         
         return {
             'risk_score': round(total_risk, 2),
@@ -124,103 +151,120 @@ class HybridPredictor:
         Get predictions for similar companies in the same sector
         Set skip_predictions=True for faster loading (only shows current prices)
         """
-        # Mapping of sectors to major Indian and international companies
-        sector_companies = {
-            'Technology': ['TCS.NS', 'INFY.NS', 'WIPRO.NS', 'AAPL', 'MSFT'],
-            'Financial Services': ['HDFCBANK.NS', 'ICICIBANK.NS', 'SBIN.NS', 'JPM', 'BAC'],
-            'Healthcare': ['SUNPHARMA.NS', 'DRREDDY.NS', 'JNJ', 'PFE'],
-            'Consumer Cyclical': ['MARUTI.NS', 'TATAMOTORS.NS', 'TSLA', 'AMZN'],
-            'Energy': ['RELIANCE.NS', 'ONGC.NS', 'XOM', 'CVX'],
-            'Industrials': ['LT.NS', 'BHARTIARTL.NS', 'BA', 'CAT'],
-            'Basic Materials': ['TATASTEEL.NS', 'HINDALCO.NS', 'BHP'],
-            'Consumer Defensive': ['ITC.NS', 'HINDUNILVR.NS', 'PG', 'KO'],
-            'Communication Services': ['BHARTIARTL.NS', 'T', 'VZ', 'META'],
-            'Real Estate': ['DLF.NS', 'GODREJPROP.NS', 'AMT'],
-            'Utilities': ['NTPC.NS', 'POWERGRID.NS', 'NEE']
-        }
-        
-        companies = sector_companies.get(sector, [])
-        sector_predictions = []
+        companies = _SECTOR_COMPANIES.get(sector, ())
         
         # Limit to 2 companies for faster performance (reduced from 3)
-        for company_symbol in companies[:2]:
-            if company_symbol == self.symbol:
-                continue
-                
-            try:
-                stock = yf.Ticker(company_symbol)
-                info = stock.info
-                hist = stock.history(period='3d')  # Reduced from 5d to 3d for faster loading
-                
-                if hist.empty:
-                    continue
-                
-                current_price = hist['Close'].iloc[-1]
-                prev_close = hist['Close'].iloc[-2] if len(hist) >= 2 else current_price
+        peers = [company_symbol for company_symbol in companies[:2] if company_symbol != self.symbol]
+        if not peers:
+            return []
+        
+        # One batched download covers every peer's recent closes
+        try:
+            history = download_cached(peers, '3d')  # Reduced from 5d to 3d for faster loading
+        except Exception:
+            logger.exception("Error downloading sector history for %s", peers)
+            return []
+        
+        # Info lookups (and full predictions) run concurrently, kept in the sector list's order
+        futures = [_peer_executor.submit(self.analyze_sector_peer, company_symbol, history, skip_predictions)
+                   for company_symbol in peers]
+        sector_predictions = [result for result in (future.result() for future in futures) if result is not None]
+        
+        # Rounding is presentation-only, so every peer's numbers are rounded in one pass
+        if sector_predictions:
+            rounded = np.round([[peer[field] for field in _PEER_FIELDS] for peer in sector_predictions], 2)
+            for peer, row in zip(sector_predictions, rounded.tolist()):
+                peer.update(zip(_PEER_FIELDS, row))
+        return sector_predictions
+    
+    def analyze_sector_peer(self, company_symbol, history, skip_predictions=False):
+        """
+        Current price and predicted move for one sector peer, or None if it can't be fetched
+        """
+        try:
+            info = get_info_cached(company_symbol)
+            closes = closes_from_download(history, company_symbol)
+            
+            if closes.empty:
+                return None
+            
+            current_price = closes.iloc[-1]
+            prev_close = closes.iloc[-2] if len(closes) >= 2 else current_price
+            # Avoid division by zero
+            if prev_close > 0:
+                change_percent = ((current_price - prev_close) / prev_close) * 100
+            else:
+                change_percent = 0
+            
+            if skip_predictions:
+                # Quick mode - just show current prices
+                # Estimate prediction based on recent trend
                 # Avoid division by zero
-                if prev_close > 0:
-                    change_percent = ((current_price - prev_close) / prev_close) * 100
+                start_price = closes.iloc[0]
+                if start_price > 0:
+                    recent_change = ((closes.iloc[-1] - start_price) / start_price) * 100
+                    predicted_price = current_price * (1 + (recent_change * 0.1) / 100)
+                    predicted_change = recent_change * 0.1
                 else:
-                    change_percent = 0
+                    predicted_price = current_price
+                    predicted_change = 0
                 
-                if skip_predictions:
-                    # Quick mode - just show current prices
-                    # Estimate prediction based on recent trend
-                    # Avoid division by zero
-                    start_price = hist['Close'].iloc[0]
-                    if start_price > 0:
-                        recent_change = ((hist['Close'].iloc[-1] - start_price) / start_price) * 100
-                        predicted_price = current_price * (1 + (recent_change * 0.1) / 100)
-                        predicted_change = recent_change * 0.1
+                # Convert to INR if foreign stock
+                current_price_inr = convert_price_to_inr(current_price, company_symbol)
+                predicted_price_inr = convert_price_to_inr(predicted_price, company_symbol)
+                
+                return {
+                    'symbol': company_symbol,
+                    'name': info.get('longName', company_symbol),
+                    'current_price': current_price_inr,
+                    'change_percent': change_percent,
+                    'predicted_price': predicted_price_inr,
+                    'predicted_change': predicted_change
+                }
+            else:
+                # Full mode - with ML predictions (slower)
+                predictor = HistoricalPredictor(company_symbol)
+                prediction_result = predictor.predict(days=14, model_type='standard')
+                
+                if prediction_result and prediction_result.get('success'):
+                    # Predictions are already converted to INR in HistoricalPredictor
+                    predictions_list = prediction_result['predictions']
+                    if len(predictions_list) > 0:
+                        avg_prediction = sum(predictions_list) / len(predictions_list)
+                        current_price_inr = prediction_result.get('current_price', current_price)
+                        # Avoid division by zero
+                        if current_price_inr > 0:
+                            predicted_change = ((avg_prediction - current_price_inr) / current_price_inr) * 100
+                        else:
+                            predicted_change = 0
                     else:
-                        predicted_price = current_price
+                        avg_prediction = current_price
                         predicted_change = 0
                     
-                    # Convert to INR if foreign stock
-                    current_price_inr = convert_price_to_inr(current_price, company_symbol)
-                    predicted_price_inr = convert_price_to_inr(predicted_price, company_symbol)
-                    
-                    sector_predictions.append({
+                    return {
                         'symbol': company_symbol,
                         'name': info.get('longName', company_symbol),
-                        'current_price': round(current_price_inr, 2),
-                        'change_percent': round(change_percent, 2),
-                        'predicted_price': round(predicted_price_inr, 2),
-                        'predicted_change': round(predicted_change, 2)
-                    })
-                else:
-                    # Full mode - with ML predictions (slower)
-                    predictor = HistoricalPredictor(company_symbol)
-                    prediction_result = predictor.predict(days=14, model_type='standard')
-                    
-                    if prediction_result and prediction_result.get('success'):
-                        # Predictions are already converted to INR in HistoricalPredictor
-                        predictions_list = prediction_result['predictions']
-                        if len(predictions_list) > 0:
-                            avg_prediction = sum(predictions_list) / len(predictions_list)
-                            current_price_inr = prediction_result.get('current_price', current_price)
-                            # Avoid division by zero
-                            if current_price_inr > 0:
-                                predicted_change = ((avg_prediction - current_price_inr) / current_price_inr) * 100
-                            else:
-                                predicted_change = 0
-                        else:
-                            avg_prediction = current_price
-                            predicted_change = 0
-                        
-                        sector_predictions.append({
-                            'symbol': company_symbol,
-                            'name': info.get('longName', company_symbol),
-                            'current_price': round(current_price_inr, 2),
-                            'change_percent': round(change_percent, 2),
-                            'predicted_price': round(avg_prediction, 2),
-                            'predicted_change': round(predicted_change, 2)
-                        })
-            except Exception as e:
-                print(f"Error analyzing {company_symbol}: {str(e)}")
-                continue
-        
-        return sector_predictions
+                        'current_price': current_price_inr,
+                        'change_percent': change_percent,
+                        'predicted_price': avg_prediction,
+                        'predicted_change': predicted_change
+                    }
+        except Exception:
+            logger.exception("Error analyzing %s", company_symbol)
+        return None
+    
+    def fetch_sector_and_peers(self):
+        """
+        Resolve this stock's sector and analyze its peers, returning (sector, sector_analysis)
+        """
+        try:
+            sector = get_info_cached(self.symbol).get('sector', 'Unknown')
+            # Use quick mode (skip_predictions=True) for faster loading
+            sector_analysis = self.get_sector_analysis(sector, skip_predictions=True) if sector != 'Unknown' else []
+            return sector, sector_analysis
+        except Exception:
+            logger.exception("Error in sector analysis for %s", self.symbol)
+            return 'Unknown', []
     
     def explain_prediction(self, historical_result, sentiment_result, price_change_percent):
         """
@@ -229,7 +273,7 @@ class HybridPredictor:
         explanations = []
         
         # Historical Analysis Explanation
-        features = historical_result.get('features_used', [])
+        features = set(historical_result.get('features_used', ()))
         mae = historical_result.get('mae', 0)
         
         if mae < 2:
@@ -277,33 +321,44 @@ class HybridPredictor:
         Generate hybrid predictions combining both models
         """
         try:
-            # Get predictions from both models (use standard model for speed)
-            historical_result = self.historical_predictor.predict(days, model_type='standard')
-            sentiment_result = self.sentiment_analyzer.analyze()
+            # Get predictions from both models (use standard model for speed); the LSTM is
+            # CPU-bound and sentiment is network-bound, so run them side by side
+            historical_future = _predict_executor.submit(self.historical_predictor.predict, days, model_type='standard')
+            sentiment_future = _predict_executor.submit(self.sentiment_analyzer.analyze)
+            # Sector peers only depend on the symbol, so their lookups overlap with everything else
+            sector_future = _predict_executor.submit(self.fetch_sector_and_peers)
             
-            if not historical_result or not historical_result.get('success'):
-                return {
-                    'success': False,
-                    'message': 'Historical prediction failed'
-                }
+            # Fail fast: whichever model finishes first is checked first, and work that
+            # hasn't started yet is dropped as soon as either one fails
+            for future in as_completed((historical_future, sentiment_future)):
+                result = future.result()
+                if not result or not result.get('success'):
+                    for pending in (historical_future, sentiment_future, sector_future):
+                        pending.cancel()
+                    return {
+                        'success': False,
+                        'message': 'Historical prediction failed' if future is historical_future else 'Sentiment analysis failed'
+                    }
+            historical_result = historical_future.result()
+            sentiment_result = sentiment_future.result()
             
-            if not sentiment_result or not sentiment_result.get('success'):
-                return {
-                    'success': False,
-                    'message': 'Sentiment analysis failed'
-                }
+            # Read the model outputs once up front
+            hist_mae = historical_result.get('mae', 0)
+            sentiment_score = sentiment_result.get('sentiment_score', 50)
+            sentiment_confidence = sentiment_result.get('confidence', 50)
             
             # Combine predictions
-            combined_predictions, hist_weight, sent_weight = self.combine_predictions(
+            combined_predictions, hist_weight, sent_weight, stats = self.combine_predictions(
                 historical_result, sentiment_result
             )
             
             # Calculate metrics
+            # Average and range (min and max) from the combine step
             current_price = historical_result.get('current_price', 0)
-            if len(combined_predictions) > 0:
-                avg_prediction = sum(combined_predictions) / len(combined_predictions)
+            if stats:
+                avg_prediction, prediction_min, prediction_max = stats['mean'], stats['min'], stats['max']
             else:
-                avg_prediction = current_price
+                avg_prediction = prediction_min = prediction_max = current_price
             
             price_change = avg_prediction - current_price
             # Avoid division by zero
@@ -312,50 +367,43 @@ class HybridPredictor:
             else:
                 price_change_percent = 0
             
-            # Calculate prediction range (min and max)
-            if combined_predictions:
-                prediction_min = min(combined_predictions)
-                prediction_max = max(combined_predictions)
-            else:
-                prediction_min = avg_prediction
-                prediction_max = avg_prediction
-            
             # Calculate overall confidence
-            historical_confidence = (1 / (1 + historical_result.get('mae', 1))) * 100
-            sentiment_confidence = sentiment_result.get('confidence', 50)
+            historical_confidence = (1 / (1 + hist_mae)) * 100
             overall_confidence = (historical_confidence * hist_weight + 
                                 sentiment_confidence * sent_weight)
             
             # Generate dates for predictions
-            from datetime import datetime, timedelta
-            last_date = datetime.now()
-            prediction_dates = [(last_date + timedelta(days=i+1)).strftime('%Y-%m-%d') 
-                              for i in range(len(combined_predictions))]
+            prediction_dates = pd.date_range(datetime.now() + timedelta(days=1),
+                                             periods=len(combined_predictions)).strftime('%Y-%m-%d').tolist()
             
             risk_analysis = self.calculate_risk_score(historical_result, sentiment_result, price_change_percent)
             
             explanations = self.explain_prediction(historical_result, sentiment_result, price_change_percent)
             
-            stock = yf.Ticker(self.symbol)
-            sector = stock.info.get('sector', 'Unknown')
-            # Use quick mode (skip_predictions=True) for faster loading
-            sector_analysis = self.get_sector_analysis(sector, skip_predictions=True) if sector != 'Unknown' else []
+            sector, sector_analysis = sector_future.result()
+            
+            # Round every presentation field in one vectorized step
+            (avg_prediction, price_change, price_change_percent, prediction_min, prediction_max,
+             overall_confidence, hist_weight_pct, sent_weight_pct) = np.round([
+                avg_prediction, price_change, price_change_percent, prediction_min, prediction_max,
+                overall_confidence, hist_weight * 100, sent_weight * 100
+            ], 2).tolist()
             
             return {
                 'success': True,
                 'current_price': current_price,
-                'predictions': combined_predictions,
+                'predictions': combined_predictions.tolist(),
                 'prediction_dates': prediction_dates,
-                'avg_prediction': round(avg_prediction, 2),
-                'price_change': round(price_change, 2),
-                'price_change_percent': round(price_change_percent, 2),
-                'prediction_min': round(prediction_min, 2),
-                'prediction_max': round(prediction_max, 2),
-                'overall_confidence': round(overall_confidence, 2),
-                'historical_weight': round(hist_weight * 100, 2),
-                'sentiment_weight': round(sent_weight * 100, 2),
-                'historical_mae': historical_result.get('mae', 0),
-                'sentiment_score': sentiment_result.get('sentiment_score', 50),
+                'avg_prediction': avg_prediction,
+                'price_change': price_change,
+                'price_change_percent': price_change_percent,
+                'prediction_min': prediction_min,
+                'prediction_max': prediction_max,
+                'overall_confidence': overall_confidence,
+                'historical_weight': hist_weight_pct,
+                'sentiment_weight': sent_weight_pct,
+                'historical_mae': hist_mae,
+                'sentiment_score': sentiment_score,
                 'sentiment_category': sentiment_result.get('overall_sentiment', 'Neutral'),
                 'historical_data': historical_result,
                 'sentiment_data': sentiment_result,
@@ -366,7 +414,7 @@ class HybridPredictor:
             }
             
         except Exception as e:
-            print(f"Error in hybrid prediction: {str(e)}")
+            logger.exception("Error in hybrid prediction for %s", self.symbol)
             return {
                 'success': False,
                 'message': str(e)
@@ -1,10 +1,138 @@
-import requests
-from bs4 import BeautifulSoup
-from textblob import TextBlob
-from datetime import datetime, timedelta
-import yfinance as yf
+from bs4 import BeautifulSoup, SoupStrainer
+import lxml.html
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 import re
-from models.currency_utils import convert_price_to_inr, convert_prices_array_to_inr
+import time
+import logging
+from functools import lru_cache
+import numpy as np
+import requests
+from models.currency_utils import get_inr_rate
+from models.cache_utils import get_info_cached, get_history_cached, get_news_cached
+from models.http_utils import SESSION
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# VADER's word valences, loaded once; headlines are scored against it by batch_polarity
+_LEXICON = SentimentIntensityAnalyzer().lexicon
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+def batch_polarity(titles):
+    """
+    Polarity (-1 to 1) of each title from one tokenize pass and lexicon lookups:
+    the summed word valences, normalized the same way VADER scales its compound score
+    """
+    totals = np.array([sum(_LEXICON.get(token, 0.0) for token in _TOKEN_RE.findall(title.lower()))
+                       for title in titles], dtype=np.float64)
+    return totals / np.sqrt(totals * totals + 15)
+
+# Title keywords used by generate_article_summary. Longest first, so e.g. "upgrade"
+# is matched whole rather than as "up"; matching is by substring, like the old `in` checks
+_SUMMARY_KEYWORDS = (
+    'earnings', 'quarterly', 'beat', 'exceed', 'strong', 'miss', 'disappoint', 'weak',
+    'analyst', 'upgrade', 'downgrade', 'buy', 'positive', 'sell', 'negative',
+    'acquisition', 'merger', 'deal', 'dividend', 'payout', 'guidance', 'forecast', 'outlook',
+    'stock', 'share', 'rise', 'gain', 'up', 'fall', 'drop', 'down'
+)
+_SUMMARY_KEYWORD_RE = re.compile('|'.join(sorted(_SUMMARY_KEYWORDS, key=len, reverse=True)))
+
+# Publisher-specific fallback summaries, checked in order
+_PUBLISHER_SUMMARIES = (
+    ({'times of india', 'toi'}, "Latest business and market news from Times of India. Comprehensive coverage of corporate developments and market trends."),
+    ({'business standard'}, "Financial market analysis from Business Standard. Professional insights into economic and corporate developments."),
+    ({'economic times'}, "Economic and financial news from Economic Times. In-depth coverage of business and market developments."),
+    ({'reuters'}, "Global financial news from Reuters. International perspective on market developments and corporate news."),
+    ({'bloomberg'}, "Financial market intelligence from Bloomberg. Professional analysis of market trends and corporate developments."),
+)
+_PUBLISHER_RE = re.compile('|'.join(sorted((name for names, _ in _PUBLISHER_SUMMARIES for name in names), key=len, reverse=True)))
+
+# News sites serve full pages only to browser-like clients
+_BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Day offsets of the 14-day forecast
+_FORECAST_DAYS = np.arange(1, 15, dtype=np.float64)
+
+def _project_prices(current_price, total_impact, daily_decay):
+    """14-day price path, rounded to cents, with the impact shrinking by daily_decay each day"""
+    return np.round(current_price * (1.0 + total_impact * (1.0 - _FORECAST_DAYS * daily_decay)), 2)
+
+# Polarity cut points between sentiment labels; a polarity equal to a cut point takes the lower label
+_SENTIMENT_THRESH = np.array([-0.4, -0.15, 0.15, 0.4])
+_SENTIMENT_LABELS = ('Very Negative', 'Negative', 'Neutral', 'Positive', 'Very Positive')
+
+# Weights of the five performance indicators used when there is no news:
+# 1 week, 1 month, volatility, 10-day momentum, volume
+_PERFORMANCE_WEIGHTS = np.array([0.25, 0.20, 0.15, 0.20, 0.20])
+# Positions in the 3-month close array of the week-, month- and period-ago prices
+_PERFORMANCE_OFFSETS = np.array([-5, -20, 0])
+# Percent moves that make the 1 week, 1 month and momentum indicators positive or negative
+_PERFORMANCE_LIMITS = np.array([2.0, 5.0, 1.0])
+# Same moves for the news branch, led by the average headline polarity
+_NEWS_LIMITS = np.array([0.1, 2.0, 5.0, 1.0])
+_INDICATOR_LABELS = {1: 'positive', -1: 'negative', 0: 'neutral'}
+
+def _threshold_signs(values, limits):
+    """+1 where a value is above its limit, -1 where it is below -limit, 0 otherwise"""
+    return (values > limits).astype(np.int8) - (values < -limits).astype(np.int8)
+
+def _score_indicators(signs, weights):
+    """
+    Weighted scores and counts for indicator signs (+1 positive, -1 negative, 0 neutral)
+    Returns (positive_score, negative_score, neutral_score, positive_count, negative_count, neutral_count)
+    """
+    buckets = signs.astype(np.intp) + 1  # 0 negative, 1 neutral, 2 positive
+    scores = np.bincount(buckets, weights=weights, minlength=3)
+    counts = np.bincount(buckets, minlength=3)
+    return (float(scores[2]), float(scores[0]), float(scores[1]),
+            int(counts[2]), int(counts[0]), int(counts[1]))
+
+_OVERALL_LABELS = ('Negative', 'Neutral', 'Positive')
+
+def _overall_label(positive_score, negative_score, neutral_score):
+    """Positive or Negative only when that score is strictly the largest, otherwise Neutral"""
+    scores = np.array([negative_score, neutral_score, positive_score])
+    best = int(np.argmax(scores))
+    # argmax keeps the first of tied maxima; a tie between positive and negative is still Neutral
+    return _OVERALL_LABELS[best] if np.count_nonzero(scores == scores[best]) == 1 else 'Neutral'
+
+def _performance_signs(price_change_1w, price_change_1m, momentum, volatility, volume_ratio, weighted_performance):
+    """Indicator signs for the no-news analysis, in _PERFORMANCE_WEIGHTS order"""
+    trend_sign = 1 if weighted_performance > 0 else -1
+    signs = np.empty(_PERFORMANCE_WEIGHTS.size, dtype=np.int8)
+    # Indicators 1, 2 and 4: 1 week (2%), 1 month (5%) and 10-day momentum (1%) moves
+    signs[[0, 1, 3]] = _threshold_signs(np.array([price_change_1w, price_change_1m, momentum]), _PERFORMANCE_LIMITS)
+    # Indicators 3 and 5: high volatility and high volume follow the trend, otherwise neutral
+    signs[[2, 4]] = trend_sign * np.array([volatility > 0.05, volume_ratio > 1.2])
+    return signs
+
+def _news_signs(avg_sentiment, price_change_1w, price_change_1m, momentum, volatility, weighted_performance):
+    """Indicator signs for the news analysis: news, 1 week, 1 month, volatility, momentum"""
+    signs = np.empty(_NEWS_LIMITS.size + 1, dtype=np.int8)
+    # News polarity (0.1), 1 week (2%), 1 month (5%) and momentum (1%) moves
+    signs[[0, 1, 2, 4]] = _threshold_signs(np.array([avg_sentiment, price_change_1w, price_change_1m, momentum]), _NEWS_LIMITS)
+    # High volatility follows the trend; low or moderate volatility is neutral
+    signs[3] = (1 if weighted_performance > 0 else -1) if volatility > 0.05 else 0
+    return signs
+
+# Only the <item> elements of an RSS feed are needed
+_RSS_ITEMS = SoupStrainer('item')
+
+# News sources are independent network round-trips, so they are fetched side by side
+_news_executor = ThreadPoolExecutor(max_workers=6)
+# Full analyze() results are reused within the same hour
+ANALYZE_CACHE_SECONDS = 3600
+
+# Separate pool for analyze's own fetches; get_stock_news submits to _news_executor
+# and would deadlock if it waited on the same pool it runs in
+_analyze_executor = ThreadPoolExecutor(max_workers=8)
+
+class SentimentAnalysisError(Exception):
+    """A failed analysis, raised out of the response cache so it is not stored"""
 
 class SentimentAnalyzer:
     """
@@ -12,22 +140,43 @@ class SentimentAnalyzer:
     from trusted and freely accessible sources
     """
     
-    def __init__(self, symbol):
+    def __init__(self, symbol, debug=False):
         self.symbol = symbol
-        self.stock = yf.Ticker(symbol)
+        # Debug runs also return the per-indicator labels and bypass the response cache
+        self.debug = debug
         
     def get_stock_news(self):
         """
         Get news articles for the stock from multiple sources
         Priority: yfinance news > Google News scraping > Yahoo Finance > Performance-based fallback
+        All sources are fetched at once; results are still taken in priority order
         """
-        articles = []
+        # One clock read shared by every source's fallback timestamps
+        now_ts = int(time.time())
+        futures = [_news_executor.submit(fetch, now_ts) for fetch in
+                   (self.fetch_yfinance_news, self.fetch_google_news, self.fetch_yahoo_news)]
+        yfinance_news, google_news, yahoo_news = (future.result() for future in futures)
+        
+        if len(yfinance_news) >= 2:  # Lower threshold to get more news
+            return yfinance_news
+        if len(google_news) >= 2:
+            return google_news[:10]
         
-        # Try 1: Get news from yfinance (most reliable when available)
+        # Scraped sources that are thin on their own are pooled together
+        articles = google_news + yahoo_news
+        if len(articles) >= 2:
+            return articles[:8]
+        
+        # Fallback: Return empty list - the analyze() method will handle this
+        # by showing "No recent news articles available" message
+        return []
+    
+    def fetch_yfinance_news(self, now_ts):
+        """News from yfinance (most reliable when available)"""
+        formatted_news = []
         try:
-            news = self.stock.news
+            news = get_news_cached(self.symbol)
             if news and len(news) > 0:
-                formatted_news = []
                 for article in news[:8]:  # Reduced from 15 to 8 for faster processing
                     # Only include articles with valid data
                     title = article.get('title', '').strip()
@@ -40,64 +189,56 @@ class SentimentAnalyzer:
                             'publisher': publisher,
                             'link': article.get('link', '#'),
                             'summary': summary if summary else self.generate_article_summary(title, publisher),
-                            'providerPublishTime': article.get('providerPublishTime', int(datetime.now().timestamp()))
+                            'providerPublishTime': article.get('providerPublishTime', now_ts)
                         })
-                
-                if len(formatted_news) >= 2:  # Lower threshold to get more news
-                    return formatted_news
         except Exception as e:
             print(f"yfinance news error: {e}")
-            pass
-        
-        # Try 2: Scrape Google News RSS feed
+        return formatted_news
+    
+    def fetch_google_news(self, now_ts):
+        """News scraped from the Google News RSS feed"""
+        articles = []
         try:
-            info = self.stock.info
+            info = get_info_cached(self.symbol)
             company_name = info.get('longName', info.get('shortName', self.symbol))
             
             # Search Google Finance for news
             search_query = f"{company_name} stock news"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
             # Try Google News RSS feed
             rss_url = f"https://news.google.com/rss/search?q={search_query.replace(' ', '+')}&hl=en-IN&gl=IN&ceid=IN:en"
-            response = requests.get(rss_url, headers=headers, timeout=8)
+            response = SESSION.get(rss_url, headers=_BROWSER_HEADERS, timeout=8)
             
             if response.status_code == 200:
-                # Try different parsers for better compatibility
-                try:
-                    soup = BeautifulSoup(response.content, features='xml')
-                except:
-                    try:
-                        soup = BeautifulSoup(response.content, features='lxml')
-                    except:
-                        soup = BeautifulSoup(response.content, features='html.parser')
-                
-                items = soup.find_all('item')
-                
-                for item in items[:12]:
-                    title = item.find('title')
-                    pub_date = item.find('pubDate')
-                    link = item.find('link')
-                    source = item.find('source')
-                    description = item.find('description')
+                # libxml2-backed XML parser, building nodes only for <item> elements;
+                # the feed is always UTF-8, so skip encoding detection
+                soup = BeautifulSoup(response.content, 'lxml-xml', parse_only=_RSS_ITEMS, from_encoding='utf-8')
+                
+                for item in soup.find_all('item', limit=12):
+                    # One pass over the item's direct children instead of a subtree search per field
+                    children = {}
+                    for child in item.children:
+                        if child.name:
+                            children.setdefault(child.name, child)
+                    title = children.get('title')
+                    pub_date = children.get('pubDate')
+                    link = children.get('link')
+                    source = children.get('source')
+                    description = children.get('description')
                     
                     if title and title.text.strip():
                         # Parse publication date
-                        pub_timestamp = int(datetime.now().timestamp())
+                        pub_timestamp = now_ts
                         if pub_date:
                             try:
-                                pub_datetime = datetime.strptime(pub_date.text, '%a, %d %b %Y %H:%M:%S %Z')
-                                pub_timestamp = int(pub_datetime.timestamp())
+                                pub_timestamp = int(parsedate_to_datetime(pub_date.text).timestamp())
                             except:
                                 pass
                         
                         # Extract summary from description or generate one
                         summary = ""
                         if description and description.text.strip():
-                            # Clean HTML tags from description
-                            desc_text = BeautifulSoup(description.text, 'html.parser').get_text()
+                            # Clean HTML tags from description without building a soup for one snippet
+                            desc_text = lxml.html.fromstring(description.text).text_content()
                             summary = desc_text[:200] + "..." if len(desc_text) > 200 else desc_text
                         else:
                             summary = self.generate_article_summary(title.text.strip(), source.text.strip() if source else 'Google News')
@@ -109,26 +250,23 @@ class SentimentAnalyzer:
                             'summary': summary,
                             'providerPublishTime': pub_timestamp
                         })
-                
-                if len(articles) >= 2:  # Lower threshold
-                    return articles[:10]
         except Exception as e:
             print(f"Google News error: {e}")
-            pass
-        
-        # Try 3: Alternative - Yahoo Finance news page scraping
+        return articles
+    
+    def fetch_yahoo_news(self, now_ts):
+        """News scraped from the Yahoo Finance news page"""
+        articles = []
         try:
             url = f"https://finance.yahoo.com/quote/{self.symbol}/news"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=8)
+            response = SESSION.get(url, headers=_BROWSER_HEADERS, timeout=8)
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                news_items = soup.find_all('h3', class_='Mb(5px)')
+                # Use the charset from the response headers instead of sniffing the whole page
+                soup = BeautifulSoup(response.content, 'lxml', from_encoding=response.encoding or 'utf-8')
+                news_items = soup.find_all('h3', class_='Mb(5px)', limit=8)
                 
-                for item in news_items[:8]:
+                for item in news_items:
                     title_elem = item.find('a')
                     if title_elem and title_elem.text.strip():
                         summary = self.generate_article_summary(title_elem.text.strip(), 'Yahoo Finance')
@@ -137,152 +275,142 @@ class SentimentAnalyzer:
                             'publisher': 'Yahoo Finance',
                             'link': f"https://finance.yahoo.com{title_elem.get('href', '#')}",
                             'summary': summary,
-                            'providerPublishTime': int((datetime.now() - timedelta(hours=len(articles)*2)).timestamp())
+                            'providerPublishTime': now_ts - len(articles) * 2 * 3600
                         })
-                
-                if len(articles) >= 2:
-                    return articles[:8]
         except Exception as e:
             print(f"Yahoo Finance error: {e}")
-            pass
-        
-        # Fallback: Return empty list - the analyze() method will handle this
-        # by showing "No recent news articles available" message
-        return []
+        return articles
 
     def generate_article_summary(self, title, publisher):
         """
         Generate a contextual summary based on title and publisher
         """
         try:
-            # Extract key information from title
-            title_lower = title.lower()
+            # One regex scan finds every keyword in the title; the checks below are set lookups
+            words = set(_SUMMARY_KEYWORD_RE.findall(title.lower()))
             
             # Stock-specific keywords and their summaries
-            if 'earnings' in title_lower or 'quarterly' in title_lower:
-                if 'beat' in title_lower or 'exceed' in title_lower or 'strong' in title_lower:
+            if words & {'earnings', 'quarterly'}:
+                if words & {'beat', 'exceed', 'strong'}:
                     return f"Positive earnings report showing better-than-expected results. {publisher} reports strong quarterly performance with potential positive market impact."
-                elif 'miss' in title_lower or 'disappoint' in title_lower or 'weak' in title_lower:
+                elif words & {'miss', 'disappoint', 'weak'}:
                     return f"Mixed earnings results with some challenges. {publisher} highlights quarterly performance concerns that may affect stock valuation."
                 else:
                     return f"Latest quarterly earnings update from {publisher}. Financial results provide insights into company performance and market position."
             
-            elif 'analyst' in title_lower or 'upgrade' in title_lower or 'downgrade' in title_lower:
-                if 'upgrade' in title_lower or 'buy' in title_lower or 'positive' in title_lower:
+            elif words & {'analyst', 'upgrade', 'downgrade'}:
+                if words & {'upgrade', 'buy', 'positive'}:
                     return f"Analyst upgrade and positive outlook. {publisher} reports improved analyst sentiment with potential upside for investors."
-                elif 'downgrade' in title_lower or 'sell' in title_lower or 'negative' in title_lower:
+                elif words & {'downgrade', 'sell', 'negative'}:
                     return f"Analyst concerns and revised outlook. {publisher} highlights changing analyst sentiment with cautious market expectations."
                 else:
                     return f"Analyst coverage update from {publisher}. Professional analysis provides market insights and investment perspective."
             
-            elif 'acquisition' in title_lower or 'merger' in title_lower or 'deal' in title_lower:
+            elif words & {'acquisition', 'merger', 'deal'}:
                 return f"Strategic business development news. {publisher} reports on corporate transaction that may impact future growth and market position."
             
-            elif 'dividend' in title_lower or 'payout' in title_lower:
+            elif words & {'dividend', 'payout'}:
                 return f"Dividend and shareholder return update. {publisher} covers dividend policy changes affecting investor returns and company financial strategy."
             
-            elif 'guidance' in title_lower or 'forecast' in title_lower or 'outlook' in title_lower:
+            elif words & {'guidance', 'forecast', 'outlook'}:
                 return f"Financial guidance and future outlook. {publisher} provides management's perspective on future performance and strategic direction."
             
-            elif 'stock' in title_lower or 'share' in title_lower:
-                if 'rise' in title_lower or 'gain' in title_lower or 'up' in title_lower:
+            elif words & {'stock', 'share'}:
+                if words & {'rise', 'gain', 'up'}:
                     return f"Positive stock performance update. {publisher} reports favorable market movement with potential continued momentum."
-                elif 'fall' in title_lower or 'drop' in title_lower or 'down' in title_lower:
+                elif words & {'fall', 'drop', 'down'}:
                     return f"Stock performance concerns. {publisher} highlights market challenges that may require investor attention."
                 else:
                     return f"Stock market update from {publisher}. Latest trading activity and market sentiment analysis."
             
             else:
                 # Generic summary based on publisher
-                if 'times of india' in publisher.lower() or 'toi' in publisher.lower():
-                    return f"Latest business and market news from Times of India. Comprehensive coverage of corporate developments and market trends."
-                elif 'business standard' in publisher.lower():
-                    return f"Financial market analysis from Business Standard. Professional insights into economic and corporate developments."
-                elif 'economic times' in publisher.lower():
-                    return f"Economic and financial news from Economic Times. In-depth coverage of business and market developments."
-                elif 'reuters' in publisher.lower():
-                    return f"Global financial news from Reuters. International perspective on market developments and corporate news."
-                elif 'bloomberg' in publisher.lower():
-                    return f"Financial market intelligence from Bloomberg. Professional analysis of market trends and corporate developments."
-                else:
-                    return f"Latest market and business news from {publisher}. Comprehensive coverage of financial developments and market trends."
+                publishers = set(_PUBLISHER_RE.findall(publisher.lower()))
+                for names, summary in _PUBLISHER_SUMMARIES:
+                    if publishers & names:
+                        return summary
+                return f"Latest market and business news from {publisher}. Comprehensive coverage of financial developments and market trends."
                     
         except Exception as e:
             return f"Latest business news from {publisher}. Market update covering recent developments and trends."
 
-    def analyze_text_sentiment(self, text):
-        """
-        Analyze sentiment of text using TextBlob
-        Returns polarity (-1 to 1) and subjectivity (0 to 1)
-        """
-        try:
-            blob = TextBlob(text)
-            return {
-                'polarity': blob.sentiment.polarity,
-                'subjectivity': blob.sentiment.subjectivity
-            }
-        except:
-            return {'polarity': 0, 'subjectivity': 0}
-    
     def categorize_sentiment(self, polarity):
         """
         Categorize sentiment based on polarity score
         Polarity ranges from -1 to 1, which maps to 0-100 score
         Score ranges: 0-30 (Very Negative), 30-42.5 (Negative), 42.5-57.5 (Neutral), 57.5-70 (Positive), 70-100 (Very Positive)
         """
-        if polarity > 0.4:  # Score > 70
-            return 'Very Positive'
-        elif polarity > 0.15:  # Score > 57.5
-            return 'Positive'
-        elif polarity > -0.15:  # Score > 42.5
-            return 'Neutral'
-        elif polarity > -0.4:  # Score > 30
-            return 'Negative'
-        else:  # Score <= 30
-            return 'Very Negative'
+        return _SENTIMENT_LABELS[int(np.searchsorted(_SENTIMENT_THRESH, polarity))]
     
-    def get_sentiment_score(self, polarity):
+    @staticmethod
+    def _cache_key(symbol):
+        """Response cache key: the symbol and the current hour bucket"""
+        return (symbol, int(time.time() // ANALYZE_CACHE_SECONDS))
+    
+    def analyze(self):
         """
-        Convert polarity to a 0-100 sentiment score
+        Sentiment analysis for the symbol, reused for the rest of the hour once computed
+        Returns sentiment data and predictions
         """
-        return round((polarity + 1) * 50, 2)
+        if self.debug:
+            return self._analyze_uncached()
+        try:
+            return _cached_analyze(*self._cache_key(self.symbol))
+        except SentimentAnalysisError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
     
-    def analyze(self):
+    def _analyze_uncached(self):
         """
         Perform comprehensive sentiment analysis
         Returns sentiment data and predictions
         """
         try:
-            # Get news articles
-            news_articles = self.get_stock_news()
+            # News, info and history are independent requests; warm calls come straight from the caches
+            news_future = _analyze_executor.submit(self.get_stock_news)
+            info_future = _analyze_executor.submit(get_info_cached, self.symbol)
+            hist_future = _analyze_executor.submit(get_history_cached, self.symbol, '3mo')  # Reduced from 6mo to 3mo for faster loading
+            hist = hist_future.result()
+            
+            # Raw arrays so every metric below is plain slice arithmetic
+            close = hist['Close'].to_numpy(dtype=np.float64)
+            volume = hist['Volume'].to_numpy(dtype=np.float64)
+            
+            # The 10-day momentum window needs real prices; reject short or broken
+            # histories before waiting on the news fetch
+            if close.size < 10 or not close[-1] > 0:
+                return {
+                    'success': False,
+                    'message': f'Insufficient price history for {self.symbol}'
+                }
+            news_articles, info = news_future.result(), info_future.result()
             
-            # Get stock info for additional context - OPTIMIZED for speed
-            info = self.stock.info
-            hist = self.stock.history(period="3mo")  # Reduced from 6mo to 3mo for faster loading
+            # Volume and recent-price summaries shared by the trend metrics and the no-news indicators
+            avg_volume = volume.mean() if volume.size else 0
+            vol_tail5_mean = volume[-5:].mean() if volume.size else 0
+            recent_prices = close[-10:]
             
-            if not hist.empty and len(hist) > 20:
-                current_price = hist['Close'].iloc[-1]
-                
-                # Calculate multiple timeframe performance
-                week_ago_price = hist['Close'].iloc[-5] if len(hist) >= 5 else current_price
-                month_ago_price = hist['Close'].iloc[-20] if len(hist) >= 20 else current_price
-                three_month_ago_price = hist['Close'].iloc[0]
+            if close.size > 20:
+                current_price = close[-1]
                 
+                # Calculate multiple timeframe performance in one pass: 1 week, 1 month and 3 months ago
+                refs = close[_PERFORMANCE_OFFSETS]
                 # Avoid division by zero
-                price_change_1w = ((current_price - week_ago_price) / week_ago_price) * 100 if week_ago_price > 0 else 0
-                price_change_1m = ((current_price - month_ago_price) / month_ago_price) * 100 if month_ago_price > 0 else 0
-                price_change_3m = ((current_price - three_month_ago_price) / three_month_ago_price) * 100 if three_month_ago_price > 0 else 0
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    changes = np.where(refs > 0, (current_price - refs) / refs * 100, 0.0)
+                price_change_1w, price_change_1m, price_change_3m = changes.tolist()
                 
                 # Calculate volatility (standard deviation of returns)
-                returns = hist['Close'].pct_change().dropna()
-                volatility = returns.std() * 100
+                returns = np.diff(close) / close[:-1]
+                volatility = float(returns.std(ddof=1) * 100)
                 
                 # Calculate momentum indicators
-                recent_returns = returns.tail(10).mean() * 100
+                recent_returns = float(returns[-10:].mean() * 100)
                 # Avoid division by zero in volume trend
-                avg_volume = hist['Volume'].mean()
                 if avg_volume > 0:
-                    volume_trend = (hist['Volume'].tail(5).mean() / avg_volume) - 1
+                    volume_trend = (vol_tail5_mean / avg_volume) - 1
                 else:
                     volume_trend = 0
             else:
@@ -339,133 +467,42 @@ class SentimentAnalyzer:
                 # Recategorize based on final sentiment
                 sentiment_label = self.categorize_sentiment(final_sentiment)
                 
-                # Create comprehensive sentiment analysis using multiple indicators
-                sentiment_indicators = []
-                indicator_weights = []
-                
-                # Indicator 1: Recent price performance (1 week) - Weight: 0.25
-                if price_change_1w > 2:
-                    sentiment_indicators.append('positive')
-                    indicator_weights.append(0.25)
-                elif price_change_1w < -2:
-                    sentiment_indicators.append('negative')
-                    indicator_weights.append(0.25)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.25)
-                
-                # Indicator 2: Recent price performance (1 month) - Weight: 0.20
-                if price_change_1m > 5:
-                    sentiment_indicators.append('positive')
-                    indicator_weights.append(0.20)
-                elif price_change_1m < -5:
-                    sentiment_indicators.append('negative')
-                    indicator_weights.append(0.20)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.20)
-                
-                # Indicator 3: Volatility analysis - Weight: 0.15
-                if volatility < 0.02:  # Low volatility = stable
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.15)
-                elif volatility > 0.05:  # High volatility
-                    if weighted_performance > 0:
-                        sentiment_indicators.append('positive')
-                        indicator_weights.append(0.15)
-                    else:
-                        sentiment_indicators.append('negative')
-                        indicator_weights.append(0.15)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.15)
-                
-                # Indicator 4: Momentum trend (10-day) - Weight: 0.20
-                recent_prices = hist['Close'].tail(10)
+                # Create comprehensive sentiment analysis using multiple indicators;
+                # signs[i] is +1 (positive), -1 (negative) or 0 (neutral) for indicator i
                 # Avoid division by zero
-                start_price = recent_prices.iloc[0]
-                if start_price > 0:
-                    momentum = (recent_prices.iloc[-1] - start_price) / start_price * 100
-                else:
-                    momentum = 0
-                if momentum > 1:
-                    sentiment_indicators.append('positive')
-                    indicator_weights.append(0.20)
-                elif momentum < -1:
-                    sentiment_indicators.append('negative')
-                    indicator_weights.append(0.20)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.20)
-                
-                # Indicator 5: Volume analysis - Weight: 0.20
-                avg_volume = hist['Volume'].mean()
-                recent_volume = hist['Volume'].tail(5).mean()
-                # Avoid division by zero
-                if avg_volume > 0:
-                    volume_ratio = recent_volume / avg_volume
-                else:
-                    volume_ratio = 1
-                if volume_ratio > 1.2:  # High volume
-                    if weighted_performance > 0:
-                        sentiment_indicators.append('positive')
-                        indicator_weights.append(0.20)
-                    else:
-                        sentiment_indicators.append('negative')
-                        indicator_weights.append(0.20)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(0.20)
+                momentum = (recent_prices[-1] - recent_prices[0]) / recent_prices[0] * 100 if recent_prices[0] > 0 else 0
+                volume_ratio = vol_tail5_mean / avg_volume if avg_volume > 0 else 1
+                signs = _performance_signs(price_change_1w, price_change_1m, momentum,
+                                           volatility, volume_ratio, weighted_performance)
                 
-                # Calculate weighted sentiment scores
-                positive_score = 0
-                negative_score = 0
-                neutral_score = 0
-                
-                for i, indicator in enumerate(sentiment_indicators):
-                    weight = indicator_weights[i]
-                    if indicator == 'positive':
-                        positive_score += weight
-                    elif indicator == 'negative':
-                        negative_score += weight
-                    else:
-                        neutral_score += weight
-                
-                # Count indicators for display
-                positive_count = sentiment_indicators.count('positive')
-                negative_count = sentiment_indicators.count('negative')
-                neutral_count = sentiment_indicators.count('neutral')
-                total_indicators = len(sentiment_indicators)
+                # Calculate weighted sentiment scores and counts
+                (positive_score, negative_score, neutral_score,
+                 positive_count, negative_count, neutral_count) = _score_indicators(signs, _PERFORMANCE_WEIGHTS)
+                total_indicators = int(signs.size)
                 
                 # Determine overall sentiment based on weighted scores
-                if positive_score > negative_score and positive_score > neutral_score:
-                    overall_sentiment_label = 'Positive'
-                elif negative_score > positive_score and negative_score > neutral_score:
-                    overall_sentiment_label = 'Negative'
-                else:
-                    overall_sentiment_label = 'Neutral'
+                overall_sentiment_label = _overall_label(positive_score, negative_score, neutral_score)
                 
                 # Calculate sentiment score (0-100 scale) - this will be consistent with sentiment category
                 sentiment_score = (positive_score - negative_score) * 100 + 50
                 sentiment_score = max(0, min(100, sentiment_score))
                 
                 # Generate predictions based on the SAME sentiment logic to ensure consistency
-                # Convert sentiment score to impact factor (-1 to 1 range)
-                sentiment_impact_factor = (sentiment_score - 50) / 50  # -1 to 1
+                # Impact factor (-1 to 1 range) taken straight from the raw scores;
+                # (score - 50) / 50 with score = diff * 100 + 50 clamped to 0-100 is 2 * diff clamped to -1..1
+                sentiment_impact_factor = max(-1.0, min(1.0, 2 * (positive_score - negative_score)))
                 sentiment_impact = sentiment_impact_factor * 0.08  # Max 8% impact
                 momentum_impact = (weighted_performance / 100) * 0.02
                 total_impact = sentiment_impact + momentum_impact
                 predicted_change_percent = total_impact * 100
                 
-                predictions = []
-                for day in range(1, 15):
-                    daily_impact = total_impact * (1 - (day * 0.04))
-                    predicted_price = current_price * (1 + daily_impact)
-                    predictions.append(round(predicted_price, 2))
+                # 14-day predictions, impact decaying 4% per day
+                predictions = _project_prices(current_price, total_impact, 0.04)
                 
                 # Convert prices to INR if foreign stock
-                current_price_inr = convert_price_to_inr(current_price, self.symbol)
-                predictions_inr = convert_prices_array_to_inr(predictions, self.symbol)
+                inr_rate = get_inr_rate(self.symbol)
+                current_price_inr = current_price * inr_rate
+                predictions_inr = predictions * inr_rate
                 
                 # Calculate confidence
                 data_confidence = min((len(hist) / 120) * 100, 100)
@@ -475,7 +512,14 @@ class SentimentAnalyzer:
                 confidence = (data_confidence * 0.4 + volatility_confidence * 0.4 + performance_confidence * 0.2)
                 confidence = max(30, min(85, confidence))
                 
-                return {
+                # Round every two-decimal field, predictions included, in one vectorized step
+                rounded = np.round(np.concatenate(([confidence, current_price_inr, predicted_change_percent, price_change_1w,
+                                                    price_change_1m, price_change_3m, volatility], predictions_inr)), 2).tolist()
+                (confidence, current_price_inr, predicted_change_percent, price_change_1w,
+                 price_change_1m, price_change_3m, volatility) = rounded[:7]
+                predictions_inr = rounded[7:]
+                
+                result = {
                     'success': True,
                     'overall_sentiment': overall_sentiment_label,
                     'sentiment_score': round(sentiment_score, 0),
@@ -484,43 +528,45 @@ class SentimentAnalyzer:
                     'negative_count': negative_count,
                     'neutral_count': neutral_count,
                     'total_indicators': total_indicators,
-                    'confidence': round(confidence, 2),
-                    'current_price': round(current_price_inr, 2),
-                    'predicted_change_percent': round(predicted_change_percent, 2),
-                    'predictions': [round(p, 2) for p in predictions_inr],
+                    'confidence': confidence,
+                    'current_price': current_price_inr,
+                    'predicted_change_percent': predicted_change_percent,
+                    'predictions': predictions_inr,
                     'articles': [],  # Empty array - no fake articles
                     'currency': 'INR',
-                    'performance_1w': round(price_change_1w, 2),
-                    'performance_1m': round(price_change_1m, 2),
-                    'performance_3m': round(price_change_3m, 2),
-                    'volatility': round(volatility, 2),
-                    'sentiment_indicators': sentiment_indicators  # For debugging
+                    'performance_1w': price_change_1w,
+                    'performance_1m': price_change_1m,
+                    'performance_3m': price_change_3m,
+                    'volatility': volatility
                 }
-            
-            sentiments = []
+                if self.debug:
+                    result['sentiment_indicators'] = [_INDICATOR_LABELS[sign] for sign in signs.tolist()]
+                return result
+            
+            # Score every headline in one pass up front
+            news_articles = news_articles[:20]
+            polarities = batch_polarity([article.get('title', '') for article in news_articles])
+            sentiments = polarities.tolist()
+            label_indices = np.searchsorted(_SENTIMENT_THRESH, polarities).tolist()
+            scores = np.round((polarities + 1) * 50, 2).tolist()
             articles_data = []
             
-            for article in news_articles[:20]:
+            for article, polarity, label_index, score in zip(news_articles, sentiments, label_indices, scores):
                 title = article.get('title', '')
                 publisher = article.get('publisher', 'Unknown')
                 link = article.get('link', '')
                 published = article.get('providerPublishTime', 0)
                 summary = article.get('summary', '')
                 
-                # Analyze title sentiment
-                sentiment = self.analyze_text_sentiment(title)
-                
-                sentiments.append(sentiment['polarity'])
-                
                 articles_data.append({
                     'title': title,
                     'publisher': publisher,
                     'link': link,
                     'published': datetime.fromtimestamp(published).strftime('%Y-%m-%d %H:%M') if published else 'Unknown',
                     'summary': summary,
-                    'sentiment': self.categorize_sentiment(sentiment['polarity']),
-                    'polarity': round(sentiment['polarity'], 3),
-                    'score': self.get_sentiment_score(sentiment['polarity'])
+                    'sentiment': _SENTIMENT_LABELS[label_index],
+                    'polarity': round(polarity, 3),
+                    'score': score
                 })
             
             # Calculate overall sentiment from news
@@ -547,8 +593,6 @@ class SentimentAnalyzer:
             final_sentiment = max(-1, min(1, final_sentiment))
             
             # Generate predictions based on news sentiment and performance
-            predictions = []
-            
             # Calculate sentiment impact from news and performance
             news_impact = avg_sentiment * 0.05 if sentiments else 0  # Max 5% impact from news
             performance_impact = (price_change_1w + price_change_1m) / 2 * 0.01  # Performance impact
@@ -556,15 +600,13 @@ class SentimentAnalyzer:
             
             total_impact = news_impact + performance_impact + volatility_impact
             
-            # Generate 14-day predictions
-            for day in range(1, 15):
-                daily_impact = total_impact * (1 - (day * 0.03))  # Decay over time
-                predicted_price = current_price * (1 + daily_impact)
-                predictions.append(round(predicted_price, 2))
+            # Generate 14-day predictions, impact decaying 3% per day
+            predictions = _project_prices(current_price, total_impact, 0.03)
             
             # Calculate predicted change percent for consistency
-            if predictions:
-                avg_prediction = sum(predictions) / len(predictions)
+            # Avoid division by zero
+            if current_price > 0:
+                avg_prediction = predictions.mean()
                 predicted_change_percent = ((avg_prediction - current_price) / current_price) * 100
             else:
                 predicted_change_percent = total_impact * 100
@@ -582,129 +624,53 @@ class SentimentAnalyzer:
             confidence = max(40, min(95, confidence))
             
             # Convert prices to INR if foreign stock
-            current_price_inr = convert_price_to_inr(current_price, self.symbol)
-            predictions_inr = convert_prices_array_to_inr(predictions, self.symbol)
-            
-            # Create comprehensive sentiment analysis combining news and performance
-            sentiment_indicators = []
-            indicator_weights = []
-            
-            # News sentiment indicators
-            if sentiments:
-                # News sentiment (weighted by number of articles)
-                news_weight = min(len(sentiments) / 20, 1.0) * 0.4  # Max 40% weight
-                if avg_sentiment > 0.1:
-                    sentiment_indicators.append('positive')
-                    indicator_weights.append(news_weight)
-                elif avg_sentiment < -0.1:
-                    sentiment_indicators.append('negative')
-                    indicator_weights.append(news_weight)
-                else:
-                    sentiment_indicators.append('neutral')
-                    indicator_weights.append(news_weight)
-            
-            # Performance indicators (same as performance-based analysis)
-            # Indicator 1: Recent price performance (1 week) - Weight: 0.15
-            if price_change_1w > 2:
-                sentiment_indicators.append('positive')
-                indicator_weights.append(0.15)
-            elif price_change_1w < -2:
-                sentiment_indicators.append('negative')
-                indicator_weights.append(0.15)
-            else:
-                sentiment_indicators.append('neutral')
-                indicator_weights.append(0.15)
-            
-            # Indicator 2: Recent price performance (1 month) - Weight: 0.15
-            if price_change_1m > 5:
-                sentiment_indicators.append('positive')
-                indicator_weights.append(0.15)
-            elif price_change_1m < -5:
-                sentiment_indicators.append('negative')
-                indicator_weights.append(0.15)
-            else:
-                sentiment_indicators.append('neutral')
-                indicator_weights.append(0.15)
-            
-            # Indicator 3: Volatility analysis - Weight: 0.10
-            if volatility < 0.02:
-                sentiment_indicators.append('neutral')
-                indicator_weights.append(0.10)
-            elif volatility > 0.05:
-                if weighted_performance > 0:
-                    sentiment_indicators.append('positive')
-                    indicator_weights.append(0.10)
-                else:
-                    sentiment_indicators.append('negative')
-                    indicator_weights.append(0.10)
-            else:
-                sentiment_indicators.append('neutral')
-                indicator_weights.append(0.10)
-            
-            # Indicator 4: Momentum trend - Weight: 0.10
-            recent_prices = hist['Close'].tail(10)
+            inr_rate = get_inr_rate(self.symbol)
+            current_price_inr = current_price * inr_rate
+            predictions_inr = predictions * inr_rate
+            
+            # Create comprehensive sentiment analysis combining news and performance;
+            # signs[i] is +1 (positive), -1 (negative) or 0 (neutral) for indicator i
+            news_weight = min(len(sentiments) / 20, 1.0) * 0.4  # News sentiment, max 40% weight
+            # News, 1 week, 1 month, volatility, momentum
+            weights = np.array([news_weight, 0.15, 0.15, 0.10, 0.10])
             # Avoid division by zero
-            start_price = recent_prices.iloc[0]
-            if start_price > 0:
-                momentum = (recent_prices.iloc[-1] - start_price) / start_price * 100
-            else:
-                momentum = 0
-            if momentum > 1:
-                sentiment_indicators.append('positive')
-                indicator_weights.append(0.10)
-            elif momentum < -1:
-                sentiment_indicators.append('negative')
-                indicator_weights.append(0.10)
-            else:
-                sentiment_indicators.append('neutral')
-                indicator_weights.append(0.10)
-            
-            # Calculate weighted sentiment scores
-            positive_score = 0
-            negative_score = 0
-            neutral_score = 0
-            
-            for i, indicator in enumerate(sentiment_indicators):
-                weight = indicator_weights[i]
-                if indicator == 'positive':
-                    positive_score += weight
-                elif indicator == 'negative':
-                    negative_score += weight
-                else:
-                    neutral_score += weight
+            momentum = (recent_prices[-1] - recent_prices[0]) / recent_prices[0] * 100 if recent_prices[0] > 0 else 0
+            signs = _news_signs(avg_sentiment, price_change_1w, price_change_1m, momentum,
+                                volatility, weighted_performance)
+            
+            # The news indicator only counts when there are articles
+            if not sentiments:
+                signs, weights = signs[1:], weights[1:]
             
-            # Count indicators for display
-            positive_count = sentiment_indicators.count('positive')
-            negative_count = sentiment_indicators.count('negative')
-            neutral_count = sentiment_indicators.count('neutral')
-            total_indicators = len(sentiment_indicators)
+            # Calculate weighted sentiment scores and counts
+            (positive_score, negative_score, neutral_score,
+             positive_count, negative_count, neutral_count) = _score_indicators(signs, weights)
+            total_indicators = int(signs.size)
             
             # Determine overall sentiment based on weighted scores
-            if positive_score > negative_score and positive_score > neutral_score:
-                overall_sentiment_label = 'Positive'
-            elif negative_score > positive_score and negative_score > neutral_score:
-                overall_sentiment_label = 'Negative'
-            else:
-                overall_sentiment_label = 'Neutral'
+            overall_sentiment_label = _overall_label(positive_score, negative_score, neutral_score)
             
             # Calculate sentiment score (0-100 scale)
             sentiment_score = (positive_score - negative_score) * 100 + 50
             sentiment_score = max(0, min(100, sentiment_score))
             
             # Generate predictions based on the SAME sentiment logic to ensure consistency
-            # Convert sentiment score to impact factor (-1 to 1 range)
-            sentiment_impact_factor = (sentiment_score - 50) / 50  # -1 to 1
+            # Impact factor (-1 to 1 range) taken straight from the raw scores;
+            # (score - 50) / 50 with score = diff * 100 + 50 clamped to 0-100 is 2 * diff clamped to -1..1
+            sentiment_impact_factor = max(-1.0, min(1.0, 2 * (positive_score - negative_score)))
             sentiment_impact = sentiment_impact_factor * 0.08  # Max 8% impact
             momentum_impact = (weighted_performance / 100) * 0.02
             total_impact = sentiment_impact + momentum_impact
             predicted_change_percent = total_impact * 100
             
-            for day in range(1, 15):
-                daily_impact = total_impact * (1 - (day * 0.04))
-                predicted_price = current_price * (1 + daily_impact)
-                predictions.append(round(predicted_price, 2))
+            # Round every two-decimal field, predictions included, in one vectorized step
+            rounded = np.round(np.concatenate(([confidence, current_price_inr, predicted_change_percent, price_change_1w,
+                                                price_change_1m, price_change_3m, volatility], predictions_inr)), 2).tolist()
+            (confidence, current_price_inr, predicted_change_percent, price_change_1w,
+             price_change_1m, price_change_3m, volatility) = rounded[:7]
+            predictions_inr = rounded[7:]
             
-            return {
+            result = {
                 'success': True,
                 'overall_sentiment': overall_sentiment_label,
                 'sentiment_score': round(sentiment_score, 0),
@@ -714,23 +680,32 @@ class SentimentAnalyzer:
                 'neutral_count': neutral_count,
                 'total_indicators': total_indicators,
                 'total_articles': len(sentiments),
-                'confidence': round(confidence, 2),
-                'current_price': round(current_price_inr, 2),
-                'predicted_change_percent': round(predicted_change_percent, 2),
-                'predictions': [round(p, 2) for p in predictions_inr],
+                'confidence': confidence,
+                'current_price': current_price_inr,
+                'predicted_change_percent': predicted_change_percent,
+                'predictions': predictions_inr,
                 'articles': articles_data[:10],
                 'currency': 'INR',
-                'performance_1w': round(price_change_1w, 2),
-                'performance_1m': round(price_change_1m, 2),
-                'performance_3m': round(price_change_3m, 2),
-                'volatility': round(volatility, 2),
-                'sentiment_indicators': sentiment_indicators  # For debugging
+                'performance_1w': price_change_1w,
+                'performance_1m': price_change_1m,
+                'performance_3m': price_change_3m,
+                'volatility': volatility
             }
+            if self.debug:
+                result['sentiment_indicators'] = [_INDICATOR_LABELS[sign] for sign in signs.tolist()]
+            return result
             
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
+        except (KeyError, ValueError, IndexError, ZeroDivisionError, requests.RequestException) as e:
+            logger.exception("Sentiment analysis failed for %s", self.symbol)
             return {
                 'success': False,
                 'message': str(e)
             }
+
+@lru_cache(maxsize=1024)
+def _cached_analyze(symbol, bucket):
+    """Analysis for a symbol, computed once per hour bucket; failures are raised so they are never cached"""
+    result = SentimentAnalyzer(symbol)._analyze_uncached()
+    if not result.get('success'):
+        raise SentimentAnalysisError(result.get('message', 'Sentiment analysis failed'))
+    return result
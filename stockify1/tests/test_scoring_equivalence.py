@@ -0,0 +1,214 @@
+"""
+The NumPy scoring kernels must give the same labels, counts and scores as the
+if/elif ladders they replaced. The reference functions below are the original
+branch logic, run on the same inputs as the kernels.
+"""
+import bisect
+import itertools
+
+import pytest
+
+np = pytest.importorskip('numpy')
+sa = pytest.importorskip('models.sentiment_analyzer')
+
+
+# Original branch logic
+
+def ref_categorize_sentiment(polarity):
+    if polarity > 0.4:
+        return 'Very Positive'
+    elif polarity > 0.15:
+        return 'Positive'
+    elif polarity > -0.15:
+        return 'Neutral'
+    elif polarity > -0.4:
+        return 'Negative'
+    else:
+        return 'Very Negative'
+
+def ref_threshold(value, limit):
+    if value > limit:
+        return 'positive'
+    elif value < -limit:
+        return 'negative'
+    else:
+        return 'neutral'
+
+def ref_trend(flag, weighted_performance):
+    if flag:
+        return 'positive' if weighted_performance > 0 else 'negative'
+    return 'neutral'
+
+def ref_volatility(volatility, weighted_performance):
+    if volatility < 0.02:
+        return 'neutral'
+    elif volatility > 0.05:
+        return ref_trend(True, weighted_performance)
+    else:
+        return 'neutral'
+
+def ref_performance_indicators(p1w, p1m, momentum, volatility, volume_ratio, weighted_performance):
+    return [ref_threshold(p1w, 2), ref_threshold(p1m, 5),
+            ref_volatility(volatility, weighted_performance),
+            ref_threshold(momentum, 1), ref_trend(volume_ratio > 1.2, weighted_performance)]
+
+def ref_news_indicators(avg_sentiment, p1w, p1m, momentum, volatility, weighted_performance):
+    return [ref_threshold(avg_sentiment, 0.1), ref_threshold(p1w, 2), ref_threshold(p1m, 5),
+            ref_volatility(volatility, weighted_performance), ref_threshold(momentum, 1)]
+
+def ref_score(indicators, weights):
+    positive_score = 0
+    negative_score = 0
+    neutral_score = 0
+    for i, indicator in enumerate(indicators):
+        weight = weights[i]
+        if indicator == 'positive':
+            positive_score += weight
+        elif indicator == 'negative':
+            negative_score += weight
+        else:
+            neutral_score += weight
+    return (positive_score, negative_score, neutral_score,
+            indicators.count('positive'), indicators.count('negative'), indicators.count('neutral'))
+
+def ref_overall_label(positive_score, negative_score, neutral_score):
+    if positive_score > negative_score and positive_score > neutral_score:
+        return 'Positive'
+    elif negative_score > positive_score and negative_score > neutral_score:
+        return 'Negative'
+    else:
+        return 'Neutral'
+
+def ref_risk_factors(mae, sentiment_score, price_change_percent, confidence):
+    return [min(mae * 10, 30), abs(50 - sentiment_score) / 2,
+            min(abs(price_change_percent) * 2, 25), (100 - confidence) / 5]
+
+def ref_risk_band(total_risk):
+    if total_risk < 25:
+        band = ('Low Risk', 'Strong Buy', '#10b981')
+    elif total_risk < 40:
+        band = ('Low-Medium Risk', 'Buy', '#22c55e')
+    elif total_risk < 55:
+        band = ('Medium Risk', 'Hold', '#f59e0b')
+    elif total_risk < 70:
+        band = ('Medium-High Risk', 'Sell', '#f97316')
+    else:
+        band = ('High Risk', 'Strong Sell', '#ef4444')
+    return band
+
+
+# Boundary inputs: every limit exactly, just inside and just outside
+
+def around(*limits):
+    values = {0.0}
+    for limit in limits:
+        for edge in (limit, -limit):
+            values.update((edge, np.nextafter(edge, np.inf), np.nextafter(edge, -np.inf)))
+    return sorted(values)
+
+POLARITIES = around(0.15, 0.4) + [-1.0, 1.0]
+WEEK_MOVES = around(2.0)
+MONTH_MOVES = around(5.0)
+MOMENTUM_MOVES = around(1.0)
+NEWS_POLARITIES = around(0.1)
+VOLATILITIES = [0.0, 0.02, 0.03, 0.05, np.nextafter(0.05, np.inf), 0.2]
+VOLUME_RATIOS = [0.5, 1.2, np.nextafter(1.2, np.inf), 3.0]
+WEIGHTED_PERFORMANCES = [-3.0, 0.0, 3.0]
+
+
+@pytest.mark.parametrize('polarity', POLARITIES)
+def test_categorize_sentiment_matches_ladder(polarity):
+    analyzer = sa.SentimentAnalyzer.__new__(sa.SentimentAnalyzer)
+    assert analyzer.categorize_sentiment(polarity) == ref_categorize_sentiment(polarity)
+
+
+def check_scores(signs, weights, indicators, ref_weights):
+    assert [sa._INDICATOR_LABELS[sign] for sign in signs.tolist()] == indicators
+    got = sa._score_indicators(signs, weights)
+    expected = ref_score(indicators, ref_weights)
+    assert got == expected
+    assert sa._overall_label(*got[:3]) == ref_overall_label(*expected[:3])
+
+
+@pytest.mark.parametrize('volatility', VOLATILITIES)
+@pytest.mark.parametrize('weighted_performance', WEIGHTED_PERFORMANCES)
+def test_performance_indicators_match_ladder(volatility, weighted_performance):
+    moves = itertools.product(WEEK_MOVES, MONTH_MOVES, MOMENTUM_MOVES, VOLUME_RATIOS)
+    for p1w, p1m, momentum, volume_ratio in moves:
+        signs = sa._performance_signs(p1w, p1m, momentum, volatility, volume_ratio, weighted_performance)
+        indicators = ref_performance_indicators(p1w, p1m, momentum, volatility, volume_ratio, weighted_performance)
+        check_scores(signs, sa._PERFORMANCE_WEIGHTS, indicators, [0.25, 0.20, 0.15, 0.20, 0.20])
+
+
+@pytest.mark.parametrize('article_count', [0, 7, 20, 35])
+@pytest.mark.parametrize('volatility', VOLATILITIES)
+@pytest.mark.parametrize('weighted_performance', WEIGHTED_PERFORMANCES)
+def test_news_indicators_match_ladder(article_count, volatility, weighted_performance):
+    news_weight = min(article_count / 20, 1.0) * 0.4
+    moves = itertools.product(NEWS_POLARITIES, WEEK_MOVES, MONTH_MOVES, MOMENTUM_MOVES)
+    for avg_sentiment, p1w, p1m, momentum in moves:
+        signs = sa._news_signs(avg_sentiment, p1w, p1m, momentum, volatility, weighted_performance)
+        weights = np.array([news_weight, 0.15, 0.15, 0.10, 0.10])
+        indicators = ref_news_indicators(avg_sentiment, p1w, p1m, momentum, volatility, weighted_performance)
+        ref_weights = [news_weight, 0.15, 0.15, 0.10, 0.10]
+        # The news indicator only counts when there are articles
+        if not article_count:
+            signs, weights = signs[1:], weights[1:]
+            indicators, ref_weights = indicators[1:], ref_weights[1:]
+        check_scores(signs, weights, indicators, ref_weights)
+
+
+@pytest.mark.parametrize('scores', [
+    (0.4, 0.4, 0.2),    # positive == negative, both above neutral
+    (0.4, 0.2, 0.4),    # positive == neutral
+    (0.2, 0.4, 0.4),    # negative == neutral
+    (0.3, 0.3, 0.3),    # all equal
+    (0.0, 0.0, 0.0),
+    (0.5, 0.3, 0.2),
+    (0.3, 0.5, 0.2),
+    (0.3, 0.2, 0.5),
+])
+def test_overall_label_ties_match_ladder(scores):
+    assert sa._overall_label(*scores) == ref_overall_label(*scores)
+
+
+@pytest.mark.parametrize('positive_score', [0.0, 0.35, 0.4, 0.5])
+@pytest.mark.parametrize('negative_score', [0.0, 0.35, 0.4, 0.5])
+def test_equal_positive_negative_scores_match_ladder(positive_score, negative_score):
+    # Weighted scores are summed in the same order as the loop they replaced
+    signs = np.array([1, -1, 0], dtype=np.int8)
+    weights = np.array([positive_score, negative_score, 0.1])
+    got = sa._score_indicators(signs, weights)
+    expected = ref_score(['positive', 'negative', 'neutral'], [positive_score, negative_score, 0.1])
+    assert got == expected
+    assert sa._overall_label(*got[:3]) == ref_overall_label(*expected[:3])
+
+
+RISK_INPUTS = [
+    # mae, sentiment_score, price_change_percent, confidence
+    (0.0, 50, 0.0, 100),
+    (2.5, 50, 0.0, 100),      # total exactly 25
+    (2.499, 50, 0.0, 100),
+    (4.0, 50, 0.0, 100),      # 40
+    (3.0, 60, 10.0, 100),     # 30 + 5 + 20 = 55
+    (3.0, 70, 10.0, 100),     # 30 + 10 + 20 = 60
+    (3.0, 50, 12.5, 25),      # 30 + 0 + 25 + 15 = 70
+    (5.0, 0, 50.0, 0),        # every factor at its cap
+    (1.2, 83.7, -3.3, 61.5),
+]
+
+@pytest.mark.parametrize('mae, sentiment_score, price_change_percent, confidence', RISK_INPUTS)
+def test_risk_bands_match_ladder(mae, sentiment_score, price_change_percent, confidence):
+    hp = pytest.importorskip('models.hybrid_predictor')
+    scores = hp.risk_factor_scores(mae, sentiment_score, price_change_percent, confidence)[0]
+    factors = ref_risk_factors(mae, sentiment_score, price_change_percent, confidence)
+    assert scores.tolist() == factors
+    assert float(scores.sum()) == sum(factors)
+    total_risk = float(scores.sum())
+    assert hp._RISK_LEVELS[bisect.bisect_right(hp._RISK_TABLE, total_risk)] == ref_risk_band(sum(factors))
+
+
+@pytest.mark.parametrize('total_risk', [0, 24.99, 25, 39.99, 40, 54.99, 55, 69.99, 70, 70.01, 100])
+def test_risk_band_edges_match_ladder(total_risk):
+    hp = pytest.importorskip('models.hybrid_predictor')
+    assert hp._RISK_LEVELS[bisect.bisect_right(hp._RISK_TABLE, total_risk)] == ref_risk_band(total_risk)
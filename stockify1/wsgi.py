@@ -0,0 +1,7 @@
+"""
+WSGI entrypoint for running Stockify under gunicorn with threaded workers
+Real OS threads let slow Yahoo/exchange-rate calls overlap, and CPU-bound model
+training (Keras, TFLite, LightGBM) releases the GIL in native code, so one
+prediction no longer stalls every other request the way a single gevent hub did
+"""
+from app import app  # noqa: F401